@@ -0,0 +1,43 @@
+import csv
+import sys
+import time
+
+import script2
+
+# Paridade e microbenchmark do identify_country.
+# Uso: python bench_locations.py "../csvs/users_countries 19.00.05.csv"
+# Roda sem rede: locations que cairiam no Nominatim contam como não resolvidas offline.
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else 'users_countries.csv'
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = [(row['location'], row['country']) for row in csv.DictReader(f)]
+    script2.geocoder.cache = None
+    script2.geocoder.client = None
+
+    matched = mismatched = offline_misses = 0
+    for location, expected in rows:
+        country = script2.identify_country(location)
+        if not country:
+            offline_misses += 1
+            continue
+        if script2.normalize_country_name(country) == expected:
+            matched += 1
+        else:
+            mismatched += 1
+            print(f"≠ {location!r}: esperado {expected!r}, obtido {script2.normalize_country_name(country)!r}")
+    print(f"Paridade: {matched} iguais, {mismatched} diferentes, {offline_misses} dependem do Nominatim")
+
+    locations = [location for location, _ in rows]
+    script2.location_hits.cache_clear()
+    start = time.perf_counter()
+    for location in locations:
+        script2.is_valid_location(location)
+        script2.identify_country(location)
+    elapsed = time.perf_counter() - start
+    print(f"identify_country: {len(locations) / elapsed:,.0f} locations/s ({len(locations)} locations, {elapsed:.2f}s)")
+
+
+if __name__ == '__main__':
+    main()
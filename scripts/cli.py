@@ -0,0 +1,105 @@
+import argparse
+import asyncio
+import importlib
+import os
+import sys
+
+from sharding import parse_shard
+
+# etapa -> (módulo, entrada padrão, saída padrão, atributo de concorrência, conjunto no storage)
+STAGES = {
+    'discover': ('script3', None, 'reposFinal.csv', 'NUM_WORKERS', 'reposFinal'),
+    'metrics': ('script1', 'reposFinal.csv', 'repos_metrics.csv', 'NUM_WORKERS', 'repos_metrics'),
+    'users': ('script2', 'reposFinal.csv', 'users_countries.csv', 'NUM_WORKERS', 'users_countries'),
+    'prs': ('script_prs_data', 'users_countries.csv', 'prs_raw.csv', 'REPO_WORKERS', 'prs_raw'),
+    'user-metrics': ('script_user_metrics', 'users_countries.csv', 'users_metrics.csv', 'USER_WORKERS', 'users_metrics'),
+    'graph': ('collab_graph', 'prs_raw.csv', 'user_centrality.csv', None, 'user_centrality'),
+}
+
+USAGE = '''
+Exemplos:
+  GITHUB_TOKENS=ghp_a,ghp_b python cli.py discover
+  python cli.py --tokens-file tokens.txt metrics --shard 0/4 --output repos_metrics_0.csv
+  python cli.py prs --simulate
+'''
+
+
+def sidecar(output_csv, name, ext=None):
+    """repos_metrics.csv -> repos_metrics_checkpoint.jsonl: cada shard tem o seu, ao lado da saída."""
+    root, output_ext = os.path.splitext(output_csv)
+    return f'{root}_{name}{ext or output_ext}'
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(
+        description='Coleta de dados do GitHub em etapas.', epilog=USAGE,
+        formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument('--tokens-file', help='arquivo com um token por linha (além de GITHUB_TOKENS)')
+    subparsers = parser.add_subparsers(dest='stage', required=True)
+    for stage, (module, input_csv, output_csv, _, _) in STAGES.items():
+        sub = subparsers.add_parser(stage, help=f'{module}.py')
+        if input_csv:
+            sub.add_argument('--input', default=input_csv, help=f'CSV de entrada (padrão: {input_csv})')
+        sub.add_argument('--output', default=output_csv, help=f'CSV de saída (padrão: {output_csv})')
+        sub.add_argument('--parquet', action='store_true',
+                         help='grava também a saída em Parquet tipado (mesmo nome, extensão .parquet)')
+        if stage == 'graph':
+            # o grafo precisa de todas as arestas: sem shard nem workers
+            sub.add_argument('--samples', type=int, default=256,
+                             help='fontes sorteadas para a betweenness aproximada (padrão: 256)')
+            continue
+        if stage == 'user-metrics':
+            sub.add_argument('--workers', type=int,
+                             help='usuários em andamento ao mesmo tempo (padrão: 50); as requisições HTTP '
+                                  'continuam limitadas a 3 por token (MAX_CONCURRENT do script)')
+        else:
+            sub.add_argument('--workers', type=int, help='concorrência (padrão: a do script, pelo número de tokens)')
+        sub.add_argument('--shard', type=parse_shard, metavar='i/N',
+                         help='processa só a fatia i de N (0 <= i < N), estável entre máquinas')
+        if stage == 'discover':
+            sub.add_argument('--max-repos', type=int, default=1500,
+                             help='repositórios com mais estrelas a examinar (padrão: 1500)')
+        if stage == 'prs':
+            sub.add_argument('--simulate', action='store_true', help='gera PRs fictícios em vez de usar a API')
+        if stage == 'user-metrics':
+            sub.add_argument('--prs-raw', default='prs_raw.csv', help='prs_raw.csv da etapa prs (padrão: prs_raw.csv)')
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.tokens_file:
+        # os scripts leem os tokens ao serem importados
+        os.environ['GITHUB_TOKENS_FILE'] = args.tokens_file
+    module_name, _, _, workers_attr, dataset = STAGES[args.stage]
+    module = importlib.import_module(module_name)
+    if workers_attr and args.workers:
+        setattr(module, workers_attr, max(args.workers, 1))
+
+    if args.stage == 'discover':
+        module.MAX_REPOS = args.max_repos
+        module.PARTIAL_CSV = sidecar(args.output, 'partial')
+        module.main(args.output, shard=args.shard)
+    elif args.stage == 'metrics':
+        module.CHECKPOINT_FILE = sidecar(args.output, 'checkpoint', '.jsonl')
+        module.main(args.input, args.output, shard=args.shard)
+    elif args.stage == 'users':
+        module.main(args.input, args.output, shard=args.shard)
+    elif args.stage == 'prs':
+        module.PARTIAL_CSV = sidecar(args.output, 'partial')
+        module.main(args.input, args.output, shard=args.shard, use_real_api=not args.simulate)
+    elif args.stage == 'user-metrics':
+        module.PARTIAL_CSV = sidecar(args.output, 'partial')
+        module.PRS_RAW_CSV = args.prs_raw
+        asyncio.run(module.main(args.input, args.output, shard=args.shard))
+    elif args.stage == 'graph':
+        module.main(args.input, args.output, samples=args.samples)
+    if args.parquet and os.path.exists(args.output):
+        import storage
+        print(f'Parquet gerado: {storage.convert(args.output, dataset=dataset)}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
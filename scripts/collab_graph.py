@@ -0,0 +1,224 @@
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import eigsh
+
+from loaders import load_frame
+
+# Grafos de colaboração a partir do prs_raw.csv:
+#   revisão: autor -> revisor pedido no PR (dirigido, peso = número de PRs)
+#   co-contribuição: bipartido autor -- repositório em que abriu PR (não dirigido, sem peso)
+# Logins viram inteiros (pd.factorize) e os grafos são matrizes esparsas CSR.
+
+BETWEENNESS_SAMPLES = 256
+BFS_BATCH = 32
+PAGERANK_ALPHA = 0.85
+DENSE_COMPONENT = 64
+
+
+def load_prs(path):
+    prs = load_frame(path, columns=['repo_name', 'author', 'reviewers_requested'])
+    prs = prs.astype(object).where(prs.notna(), '').astype(str)
+    return prs[prs['author'] != '']
+
+
+def review_edges(prs):
+    """(repo_name, author, reviewer) de cada revisor pedido, sem auto-revisão."""
+    edges = prs.assign(reviewer=prs['reviewers_requested'].str.split(',')).explode('reviewer')
+    edges = edges[(edges['reviewer'].fillna('') != '') & (edges['reviewer'] != edges['author'])]
+    return edges[['repo_name', 'author', 'reviewer']]
+
+
+def adjacency(rows, cols, n):
+    """Matriz n x n com peso = número de ocorrências de cada par (linha, coluna)."""
+    data = np.ones(len(rows), dtype=np.float64)
+    matrix = sp.coo_matrix((data, (rows, cols)), shape=(n, n)).tocsr()
+    matrix.sum_duplicates()
+    return matrix
+
+
+def co_contribution(prs, index):
+    """Grafo bipartido autor x repositório: os len(index) primeiros nós são os usuários, os
+    seguintes os repositórios. A projeção usuário x usuário (B @ B.T) teria da ordem de
+    autores² arestas por repositório; no bipartido são só os pares (autor, repositório)."""
+    pairs = prs[['author', 'repo_name']].drop_duplicates()
+    repo_codes, repos = pd.factorize(pairs['repo_name'])
+    users = index.get_indexer(pairs['author'])
+    n = len(index)
+    repo_nodes = n + repo_codes
+    return adjacency(
+        np.concatenate([users, repo_nodes]), np.concatenate([repo_nodes, users]), n + len(repos)
+    )
+
+
+def undirected(matrix):
+    return (matrix + matrix.T).tocsr()
+
+
+def degree(matrix):
+    """Vizinhos distintos no grafo não dirigido."""
+    sym = undirected(matrix)
+    return np.diff(sym.indptr)
+
+
+def pagerank(matrix, alpha=PAGERANK_ALPHA, tol=1e-10, max_iter=200):
+    """PageRank por iteração de potência; nós sem saída distribuem o peso uniformemente."""
+    n = matrix.shape[0]
+    if n == 0:
+        return np.zeros(0)
+    out = np.asarray(matrix.sum(axis=1)).ravel()
+    dangling = out == 0
+    inv_out = np.divide(1.0, out, out=np.zeros(n), where=~dangling)
+    transition = (sp.diags(inv_out) @ matrix).T.tocsr()
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        previous = rank
+        rank = alpha * (transition @ rank + previous[dangling].sum() / n) + (1 - alpha) / n
+        if np.abs(rank - previous).sum() < n * tol:
+            break
+    return rank / rank.sum()
+
+
+def _perron(component):
+    """Maior autovalor e autovetor (positivo, norma 1) de um componente conexo."""
+    n = component.shape[0]
+    if n <= DENSE_COMPONENT:
+        values, vectors = np.linalg.eigh(component.toarray())
+        return values[-1], np.abs(vectors[:, -1])
+    # conexo: o autovalor dominante é simples (Perron-Frobenius), o vetor não depende do ARPACK
+    values, vectors = eigsh(component, k=1, which='LA', v0=np.ones(n))
+    return values[0], np.abs(vectors[:, 0])
+
+
+def eigenvector(matrix):
+    """Centralidade de autovetor do grafo não dirigido (norma 1), igual à iteração de potência a
+    partir de um vetor constante: com vários componentes, só contam os de maior autovalor, cada
+    um ponderado pela projeção do vetor constante. Resolver por componente deixa o resultado
+    determinístico mesmo quando o autovalor dominante do grafo todo é repetido."""
+    sym = undirected(matrix)
+    n = sym.shape[0]
+    result = np.zeros(n)
+    if n == 0 or sym.nnz == 0:
+        return result
+    count, labels = connected_components(sym, directed=False)
+    order = np.argsort(labels, kind='stable')
+    bounds = np.searchsorted(labels[order], np.arange(count + 1))
+    best = 0.0
+    parts = []
+    for c in range(count):
+        nodes = order[bounds[c]:bounds[c + 1]]
+        if len(nodes) < 2:
+            continue
+        value, vector = _perron(sym[nodes][:, nodes])
+        if value > best * (1 + 1e-9):
+            best = value
+            parts = [p for p in parts if p[0] >= best * (1 - 1e-9)]
+        if value >= best * (1 - 1e-9):
+            parts.append((value, nodes, vector))
+    for _, nodes, vector in parts:
+        result[nodes] = vector * vector.sum()
+    norm = np.linalg.norm(result)
+    return result / norm if norm else result
+
+
+def betweenness(matrix, samples=BETWEENNESS_SAMPLES, seed=0):
+    """Betweenness aproximada (Brandes a partir de `samples` fontes sorteadas), grafo não dirigido
+    e sem pesos, normalizada como no networkx.
+
+    Cada lote de fontes é uma BFS por níveis feita com produtos matriz esparsa x matriz densa,
+    então o custo é O(arestas x profundidade) por lote, sem laço Python por vértice.
+    """
+    sym = undirected(matrix)
+    sym.data[:] = 1.0
+    n = sym.shape[0]
+    if n < 3:
+        return np.zeros(n)
+    rng = np.random.default_rng(seed)
+    sources = rng.choice(n, size=min(samples, n), replace=False) if samples < n else np.arange(n)
+    total = np.zeros(n)
+    for start in range(0, len(sources), BFS_BATCH):
+        batch = sources[start:start + BFS_BATCH]
+        b = len(batch)
+        cols = np.arange(b)
+        sigma = np.zeros((n, b))
+        sigma[batch, cols] = 1.0
+        depth = np.full((n, b), -1, dtype=np.int32)
+        depth[batch, cols] = 0
+        frontier = sigma.copy()
+        level = 0
+        while frontier.any():
+            reached = sym @ frontier
+            new = (reached > 0) & (depth < 0)
+            level += 1
+            depth[new] = level
+            frontier = np.where(new, reached, 0.0)
+            sigma += frontier
+        delta = np.zeros((n, b))
+        for d in range(level, 0, -1):
+            child = depth == d
+            coefficient = np.where(child, (1.0 + delta) / np.where(child, sigma, 1.0), 0.0)
+            parent = depth == d - 1
+            delta += np.where(parent, sigma * (sym @ coefficient), 0.0)
+        delta[batch, cols] = 0.0
+        total += delta.sum(axis=1)
+    # cada par é contado nas duas direções; a amostra é extrapolada para todas as fontes
+    total *= n / len(sources) / 2
+    return total / ((n - 1) * (n - 2) / 2)
+
+
+def centralities(matrix, prefix, samples=BETWEENNESS_SAMPLES):
+    return {
+        f'{prefix}_degree': degree(matrix),
+        f'{prefix}_pagerank': pagerank(matrix),
+        f'{prefix}_betweenness': betweenness(matrix, samples),
+        f'{prefix}_eigenvector': eigenvector(matrix),
+    }
+
+
+def build_centrality_table(prs, samples=BETWEENNESS_SAMPLES):
+    """Uma linha por (repo_name, login) que aparece no prs_raw, com as centralidades do grafo de
+    revisão do próprio repositório e as globais (revisão e co-contribuição)."""
+    edges = review_edges(prs)
+    index = pd.Index(pd.unique(pd.concat([prs['author'], edges['reviewer']], ignore_index=True)))
+    n = len(index)
+    authors = index.get_indexer(edges['author'])
+    reviewers = index.get_indexer(edges['reviewer'])
+
+    global_columns = centralities(adjacency(authors, reviewers, n), 'review', samples)
+    # no bipartido só interessam os nós de usuário (os primeiros n)
+    cocontrib = centralities(co_contribution(prs, index), 'cocontrib', samples)
+    global_columns.update({name: values[:n] for name, values in cocontrib.items()})
+    global_table = pd.DataFrame(global_columns)
+    global_table.insert(0, 'login', index)
+
+    per_repo = []
+    edge_groups = dict(tuple(edges.groupby('repo_name', sort=False)))
+    for repo_name, repo_prs in prs.groupby('repo_name', sort=False):
+        repo_edges = edge_groups.get(repo_name, edges.iloc[:0])
+        repo_index = pd.Index(pd.unique(pd.concat([repo_prs['author'], repo_edges['reviewer']], ignore_index=True)))
+        matrix = adjacency(
+            repo_index.get_indexer(repo_edges['author']), repo_index.get_indexer(repo_edges['reviewer']), len(repo_index)
+        )
+        table = pd.DataFrame(centralities(matrix, 'repo_review', samples))
+        table.insert(0, 'login', repo_index)
+        table.insert(0, 'repo_name', repo_name)
+        per_repo.append(table)
+    table = pd.concat(per_repo, ignore_index=True) if per_repo else pd.DataFrame(columns=['repo_name', 'login'])
+    return table.merge(global_table, on='login', how='left')
+
+
+def main(input_csv='prs_raw.csv', output_csv='user_centrality.csv', samples=BETWEENNESS_SAMPLES):
+    started = time.time()
+    prs = load_prs(input_csv)
+    table = build_centrality_table(prs, samples)
+    table.to_csv(output_csv, index=False)
+    print(f"{len(prs)} PRs, {table['login'].nunique()} usuários, {table['repo_name'].nunique()} repositórios "
+          f"em {time.time() - started:.1f}s")
+    print(f"📄 CSV gerado: {output_csv} (junta com users_metrics por repo_name + login)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+from pagination import IncompletePages, fetch_pages
+
+EVENTS_PATH = os.environ.get('GITHUB_EVENTS_PATH', 'events.sqlite')
+API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+COMMIT_PAGES = 10
+ACTIVE_DAYS_COMMITS = COMMIT_PAGES * 100
+# métricas por usuário olham os PRs mais recentes de cada repositório (as 20 páginas que o
+# script_user_metrics busca da API), venham eles da API, do EventStore ou do prs_raw.csv
+USER_PR_WINDOW = 20 * 100
+
+
+class EventStore:
+    """PRs e commits de cada repositório guardados localmente uma única vez.
+
+    As métricas de repositório e de usuário são agregadas daqui com pandas; numa nova
+    sincronização só vem da API o que mudou desde a anterior (sort=updated / since=).
+    """
+
+    def __init__(self, path=EVENTS_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.executescript(
+            'CREATE TABLE IF NOT EXISTS prs ('
+            ' repo TEXT, number INTEGER, author TEXT, reviewers TEXT,'
+            ' created_at TEXT, merged_at TEXT, closed_at TEXT, updated_at TEXT,'
+            ' PRIMARY KEY (repo, number));'
+            'CREATE TABLE IF NOT EXISTS commits ('
+            ' repo TEXT, sha TEXT, author TEXT, authored_at TEXT, committed_at TEXT,'
+            ' PRIMARY KEY (repo, sha));'
+            'CREATE TABLE IF NOT EXISTS sync_state ('
+            ' repo TEXT, kind TEXT, watermark TEXT, synced_at REAL, PRIMARY KEY (repo, kind));'
+        )
+        self._conn.commit()
+
+    def _watermark(self, repo, kind):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT watermark FROM sync_state WHERE repo = ? AND kind = ?', (repo, kind)
+            ).fetchone()
+        return row[0] if row else None
+
+    def _save(self, table, rows, repo, kind, watermark):
+        with self._lock:
+            if rows:
+                placeholders = ', '.join('?' * len(rows[0]))
+                self._conn.executemany(f'INSERT OR REPLACE INTO {table} VALUES ({placeholders})', rows)
+            if watermark:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)', (repo, kind, watermark, time.time())
+                )
+            self._conn.commit()
+
+    def sync_prs(self, repo, request, executor=None):
+        """Sincroniza os PRs de 'owner/name'; devolve quantos PRs vieram da API.
+
+        A primeira vez baixa tudo na ordem padrão (por criação), que não embaralha enquanto as
+        páginas saem em paralelo; a marca d'água é o PR atualizado mais recentemente, lido antes
+        da cópia, então o que mudar durante ela vem na próxima. Depois, sort=updated em série até
+        alcançar a marca. Se alguma página falhar, levanta IncompletePages e nada é gravado.
+        """
+        url = f'{API_URL}/repos/{repo}/pulls'
+        params = {'state': 'all', 'sort': 'updated', 'direction': 'desc'}
+        watermark = self._watermark(repo, 'prs')
+        prs = []
+        if watermark is None:
+            r = request(url, dict(params, per_page=1))
+            latest = r.json() if r is not None else None
+            if not isinstance(latest, list):
+                raise IncompletePages(f'{url}: PR mais recente não veio')
+            for page in fetch_pages(request, url, {'state': 'all'}, executor=executor, strict=True):
+                prs.extend(page)
+            new_watermark = latest[0].get('updated_at') if latest else None
+        else:
+            # mais recentes primeiro: para na primeira página que alcança o que já temos; um PR
+            # atualizado no meio do caminho só empurra os outros para páginas ainda não lidas
+            page_number = 1
+            while True:
+                r = request(url, dict(params, per_page=100, page=page_number))
+                data = r.json() if r is not None else None
+                if not isinstance(data, list):
+                    raise IncompletePages(f'{url}: página {page_number} não veio')
+                fresh = [pr for pr in data if (pr.get('updated_at') or '') >= watermark]
+                prs.extend(fresh)
+                if len(fresh) < len(data) or len(data) < 100:
+                    break
+                page_number += 1
+            new_watermark = max([pr.get('updated_at') or '' for pr in prs] + [watermark])
+        rows = [
+            (repo, pr['number'], (pr.get('user') or {}).get('login'),
+             ','.join(r['login'] for r in pr.get('requested_reviewers') or [] if r.get('login')),
+             pr.get('created_at'), pr.get('merged_at'), pr.get('closed_at'), pr.get('updated_at'))
+            for pr in prs
+        ]
+        self._save('prs', rows, repo, 'prs', new_watermark)
+        return len(rows)
+
+    def sync_commits(self, repo, request, executor=None, max_pages=COMMIT_PAGES):
+        """Na primeira vez traz os max_pages*100 commits mais recentes; depois, tudo desde o último.
+        Como em sync_prs, página faltando levanta IncompletePages antes de mover a marca."""
+        url = f'{API_URL}/repos/{repo}/commits'
+        watermark = self._watermark(repo, 'commits')
+        params = {'since': watermark} if watermark else {}
+        commits = []
+        for page in fetch_pages(request, url, params, executor=executor, max_pages=None if watermark else max_pages,
+                                strict=True):
+            commits.extend(page)
+        rows = [
+            (repo, c['sha'], (c.get('author') or {}).get('login'),
+             (c['commit'].get('author') or {}).get('date'), (c['commit'].get('committer') or {}).get('date'))
+            for c in commits if c.get('commit')
+        ]
+        new_watermark = max([row[4] or '' for row in rows] + [watermark or ''])
+        self._save('commits', rows, repo, 'commits', new_watermark)
+        return len(rows)
+
+    def prs(self, repos=None):
+        return self._frame('prs', repos)
+
+    def commits(self, repos=None):
+        return self._frame('commits', repos)
+
+    def _frame(self, table, repos):
+        query = f'SELECT * FROM {table}'
+        params = []
+        if repos:
+            query += f' WHERE repo IN ({", ".join("?" * len(repos))})'
+            params = list(repos)
+        with self._lock:
+            return pd.read_sql_query(query, self._conn, params=params)
+
+    def repo_metrics(self, repos=None):
+        """prs_opened, prs_merged, time_to_merge (horas) e active_days (dias distintos entre os
+        ACTIVE_DAYS_COMMITS commits mais recentes) por repositório."""
+        prs = self.prs(repos)
+        created = pd.to_datetime(prs['created_at'], utc=True)
+        merged = pd.to_datetime(prs['merged_at'], utc=True)
+        prs['hours_to_merge'] = (merged - created).dt.total_seconds() / 3600
+        metrics = prs.groupby('repo').agg(
+            prs_opened=('number', 'size'),
+            prs_merged=('merged_at', 'count'),
+            time_to_merge=('hours_to_merge', 'mean'),
+        )
+        # janela fixa (os ACTIVE_DAYS_COMMITS commits mais recentes): o valor não cresce a cada
+        # sincronização e repositórios coletados em momentos diferentes continuam comparáveis
+        commits = self.commits(repos).sort_values('authored_at', ascending=False)
+        commits = commits.groupby('repo').head(ACTIVE_DAYS_COMMITS)
+        commits['day'] = commits['authored_at'].str[:10]
+        metrics = metrics.join(commits.groupby('repo')['day'].nunique().rename('active_days'), how='outer')
+        metrics['time_to_merge'] = metrics['time_to_merge'].round(2)
+        return metrics
+
+    def user_metrics(self, repos=None):
+        """prs_merged, avg_time_to_merge (dias) e pr_requested_as_reviewer_rate por (repo, login)."""
+        return user_pr_metrics(recent_prs(self.prs(repos)))
+
+
+def recent_prs(prs, window=USER_PR_WINDOW):
+    """Os `window` PRs de número mais alto (mais recentes) de cada repositório, na ordem da API."""
+    prs = prs.sort_values('number', ascending=False, kind='stable')
+    return prs.groupby('repo', sort=False).head(window)
+
+
+def user_pr_metrics(prs):
+    """Agregação por (repo, login) de um DataFrame com repo, number, author, reviewers (logins
+    separados por vírgula), created_at e merged_at; datas vazias contam como ausentes."""
+    totals = prs.groupby('repo').size()
+    created = pd.to_datetime(prs['created_at'].replace('', None), utc=True, errors='coerce', format='ISO8601')
+    merged = pd.to_datetime(prs['merged_at'].replace('', None), utc=True, errors='coerce', format='ISO8601')
+    prs = prs.assign(merged=merged, days_to_merge=(merged - created).dt.total_seconds() / (24 * 3600))
+    authors = prs[prs['author'].fillna('') != ''].groupby(['repo', 'author']).agg(
+        prs_merged=('merged', 'count'),
+        avg_time_to_merge=('days_to_merge', 'mean'),
+    )
+    authors.index.names = ['repo', 'login']
+    reviewers = prs[['repo', 'number']].assign(login=prs['reviewers'].fillna('').str.split(','))
+    reviewers = reviewers.explode('login')
+    reviewers = reviewers[reviewers['login'].fillna('') != ''].drop_duplicates(['repo', 'number', 'login'])
+    review_counts = reviewers.groupby(['repo', 'login']).size().rename('reviews')
+    metrics = authors.join(review_counts, how='outer')
+    repo_totals = totals.reindex(metrics.index.get_level_values('repo')).to_numpy()
+    metrics['pr_requested_as_reviewer_rate'] = metrics['reviews'].fillna(0).to_numpy() / repo_totals * 100
+    metrics['prs_merged'] = metrics['prs_merged'].fillna(0).astype(int)
+    metrics['avg_time_to_merge'] = metrics['avg_time_to_merge'].fillna(0)
+    return metrics.drop(columns='reviews')
@@ -0,0 +1,96 @@
+import os
+from datetime import datetime
+
+from github_graphql import graphql_query
+
+API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+SAMPLE_SIZE = 20
+REST_MAX_PAGES = 10
+
+ISSUES_QUERY = '''
+query($owner: String!, $name: String!, $first: Int!, $after: String) {
+  repository(owner: $owner, name: $name) {
+    issues(first: $first, after: $after, orderBy: {field: CREATED_AT, direction: DESC}) {
+      pageInfo { hasNextPage endCursor }
+      nodes { createdAt comments(first: 1) { nodes { createdAt } } }
+    }
+  }
+}
+'''
+
+
+def hours_between(start, end):
+    start = datetime.strptime(start, '%Y-%m-%dT%H:%M:%SZ')
+    end = datetime.strptime(end, '%Y-%m-%dT%H:%M:%SZ')
+    return (end - start).total_seconds() / 3600
+
+
+def first_response_graphql(scheduler, owner, repo, sample=SAMPLE_SIZE):
+    """Horas até o primeiro comentário das `sample` issues mais recentes, 100 por query.
+
+    Devolve None se a consulta GraphQL não foi possível (sem token, erro), para o
+    chamador cair no REST.
+    """
+    times = []
+    after = None
+    remaining = sample
+    while remaining > 0:
+        result = graphql_query(scheduler, ISSUES_QUERY, {
+            'owner': owner, 'name': repo, 'first': min(remaining, 100), 'after': after
+        })
+        if not result or not (result.get('data') or {}).get('repository'):
+            # falhou logo na primeira query: sem resultado; depois dela, fica o que já veio
+            return times if after else None
+        issues = result['data']['repository']['issues']
+        for issue in issues['nodes']:
+            comments = issue['comments']['nodes']
+            if comments:
+                times.append(hours_between(issue['createdAt'], comments[0]['createdAt']))
+        remaining -= len(issues['nodes'])
+        if not issues['pageInfo']['hasNextPage'] or not issues['nodes']:
+            break
+        after = issues['pageInfo']['endCursor']
+    return times
+
+
+def recent_issues(request, owner, repo, sample=SAMPLE_SIZE):
+    """As `sample` issues mais recentes pelo REST. /issues também lista PRs, que ficam de fora;
+    as páginas seguem até juntar `sample` issues, a lista acabar ou REST_MAX_PAGES (repositório
+    com issues desligadas lista só PRs e não deve ser percorrido inteiro)."""
+    url = f'{API_URL}/repos/{owner}/{repo}/issues'
+    issues = []
+    for page in range(1, REST_MAX_PAGES + 1):
+        r = request(url, {'state': 'all', 'per_page': 100, 'page': page})
+        items = r.json() if r is not None else None
+        if not isinstance(items, list):
+            # página que falhou: como no GraphQL, fica o que já veio
+            break
+        issues.extend(i for i in items if 'pull_request' not in i)
+        if len(issues) >= sample or len(items) < 100:
+            break
+    return issues[:sample]
+
+
+def first_response_rest(request, owner, repo, sample=SAMPLE_SIZE, executor=None):
+    """Mesmo cálculo pelo REST: as issues de recent_issues e, para cada uma com comentários,
+    só o primeiro (per_page=1), em paralelo no executor."""
+    issues = recent_issues(request, owner, repo, sample)
+    commented = [i for i in issues if i.get('comments', 0) > 0]
+
+    def first_comment(issue):
+        r = request(issue['comments_url'], {'per_page': 1})
+        comments = r.json() if r is not None else None
+        if comments:
+            return hours_between(issue['created_at'], comments[0]['created_at'])
+        return None
+
+    results = executor.map(first_comment, commented) if executor else map(first_comment, commented)
+    return [t for t in results if t is not None]
+
+
+def average_first_response(request, owner, repo, scheduler=None, executor=None, sample=SAMPLE_SIZE):
+    """Média em horas até o primeiro comentário, arredondada a 2 casas, ou '' sem amostra."""
+    times = first_response_graphql(scheduler, owner, repo, sample) if scheduler else None
+    if times is None:
+        times = first_response_rest(request, owner, repo, sample, executor)
+    return round(sum(times) / len(times), 2) if times else ''
@@ -0,0 +1,108 @@
+import csv
+import json
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# Servidor local que responde como a API do GitHub a partir de respostas gravadas.
+# Uso: python fixture_server.py users_countries.csv [porta]
+#      GITHUB_API_URL=http://127.0.0.1:<porta> python script2.py
+# Também responde GET /search como stub do Nominatim (NominatimClient(url=.../search)).
+
+USER_FIELD = re.compile(r'(\w+):\s*user\(login:\s*"((?:[^"\\]|\\.)*)"\)')
+
+
+def load_fixtures_from_csv(path):
+    """Usa um users_countries.csv já coletado como gravação das respostas de /users e /contributors."""
+    users = {}
+    contributors = {}
+    locations = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            login = row['login']
+            users[login] = {'login': login, 'location': row.get('location') or None,
+                            'html_url': row.get('profile_url') or f'https://github.com/{login}'}
+            if row.get('location') and row.get('country'):
+                locations[row['location']] = row['country']
+            full_name = row['repo_url'].replace('https://github.com/', '').strip('/')
+            repo_logins = contributors.setdefault(full_name, [])
+            if login not in repo_logins:
+                repo_logins.append(login)
+    return {'users': users, 'contributors': contributors, 'locations': locations}
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    fixtures = {'users': {}, 'contributors': {}, 'locations': {}}
+    calls = {'rest': 0, 'graphql': 0}
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('X-RateLimit-Remaining', '5000')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self.calls['rest'] += 1
+        parsed = urlparse(self.path)
+        parts = parsed.path.strip('/').split('/')
+        if parts == ['search']:
+            # stub do Nominatim: GET /search?q=<location>
+            location = parse_qs(parsed.query).get('q', [''])[0]
+            country = self.fixtures.get('locations', {}).get(location)
+            return self._send(200, [{'address': {'country': country}}] if country else [])
+        if len(parts) == 2 and parts[0] == 'users':
+            user = self.fixtures['users'].get(parts[1])
+            if user is None:
+                return self._send(404, {'message': 'Not Found'})
+            return self._send(200, user)
+        if len(parts) == 4 and parts[0] == 'repos' and parts[3] == 'contributors':
+            query = parse_qs(parsed.query)
+            per_page = int(query.get('per_page', ['30'])[0])
+            page = int(query.get('page', ['1'])[0])
+            logins = self.fixtures['contributors'].get(f'{parts[1]}/{parts[2]}', [])
+            chunk = logins[(page - 1) * per_page:page * per_page]
+            return self._send(200, [{'login': login, 'contributions': 1} for login in chunk])
+        self._send(404, {'message': 'Not Found'})
+
+    def do_POST(self):
+        self.calls['graphql'] += 1
+        length = int(self.headers.get('Content-Length', 0))
+        query = json.loads(self.rfile.read(length)).get('query', '')
+        data = {}
+        errors = []
+        for alias, login in USER_FIELD.findall(query):
+            login = json.loads(f'"{login}"')
+            user = self.fixtures['users'].get(login)
+            if user is None:
+                data[alias] = None
+                errors.append({'type': 'NOT_FOUND', 'path': [alias]})
+            else:
+                data[alias] = {'login': login, 'location': user['location'], 'url': user['html_url']}
+        payload = {'data': data}
+        if errors:
+            payload['errors'] = errors
+        self._send(200, payload)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_fixture_server(fixtures, port=0):
+    handler = type('Handler', (FixtureHandler,), {'fixtures': fixtures, 'calls': {'rest': 0, 'graphql': 0}})
+    server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == '__main__':
+    server = start_fixture_server(load_fixtures_from_csv(sys.argv[1]), int(sys.argv[2]) if len(sys.argv) > 2 else 8765)
+    print(f'Servindo fixtures em http://127.0.0.1:{server.server_port}')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
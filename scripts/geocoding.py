@@ -0,0 +1,169 @@
+import mmap
+import os
+import sqlite3
+import threading
+import time
+
+import pycountry
+import requests
+from unidecode import unidecode
+
+GEOCODE_CACHE_PATH = os.environ.get('GEOCODE_CACHE_PATH', 'geocode_cache.sqlite')
+NOMINATIM_URL = 'https://nominatim.openstreetmap.org/search'
+
+
+def location_key(location):
+    return unidecode(location.strip().lower()).strip(' .')
+
+
+class LocationCache:
+    """location -> país já resolvido (inclusive resultado vazio), persistido em SQLite."""
+
+    def __init__(self, path=GEOCODE_CACHE_PATH):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS locations (key TEXT PRIMARY KEY, country TEXT, source TEXT, resolved_at REAL)'
+        )
+        self._conn.commit()
+        self.hits = 0
+
+    def get(self, location):
+        with self._lock:
+            row = self._conn.execute('SELECT country FROM locations WHERE key = ?', (location_key(location),)).fetchone()
+        if row is not None:
+            self.hits += 1
+            return row[0]
+        return None
+
+    def put(self, location, country, source):
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO locations VALUES (?, ?, ?, ?)',
+                (location_key(location), country, source, time.time())
+            )
+            self._conn.commit()
+
+
+class Gazetteer:
+    """Índice offline nome de cidade/região -> país.
+
+    Sempre inclui as subdivisões do pycountry (estados, províncias, regiões); com um
+    arquivo de cidades do GeoNames (cities500/cities15000.txt) inclui também as cidades,
+    lido via mmap e, para nomes repetidos, fica o lugar mais populoso.
+    """
+
+    def __init__(self, geonames_path=None):
+        self._index = {}
+        self._load_subdivisions()
+        if geonames_path:
+            self._load_geonames(geonames_path)
+
+    def _add(self, name, country, population):
+        key = location_key(name)
+        if len(key) < 3:
+            return
+        current = self._index.get(key)
+        if current is None or population > current[1]:
+            self._index[key] = (country, population)
+        elif population == current[1] and current[0] != country:
+            # mesmo nome em países diferentes sem critério de desempate: ambíguo
+            self._index[key] = (None, population)
+
+    def _load_subdivisions(self):
+        for subdivision in pycountry.subdivisions:
+            country = pycountry.countries.get(alpha_2=subdivision.country_code)
+            if country:
+                self._add(subdivision.name, country.name, 0)
+
+    def _load_geonames(self, path):
+        # colunas: geonameid, name, asciiname, alternatenames, lat, lon, fclass, fcode, country, cc2, admin1..4, population, ...
+        names = {c.alpha_2: c.name for c in pycountry.countries}
+        with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            for line in iter(mm.readline, b''):
+                cols = line.decode('utf-8', errors='replace').split('\t')
+                if len(cols) < 15 or cols[8] not in names:
+                    continue
+                population = int(cols[14] or 0)
+                self._add(cols[1], names[cols[8]], population)
+                if cols[2] != cols[1]:
+                    self._add(cols[2], names[cols[8]], population)
+
+    def __len__(self):
+        return len(self._index)
+
+    def lookup(self, location):
+        parts = [p for p in location.replace(';', ',').replace('|', ',').replace('/', ',').split(',') if p.strip()]
+        for candidate in [location] + parts[::-1]:
+            entry = self._index.get(location_key(candidate))
+            if entry and entry[0]:
+                return entry[0]
+        return ''
+
+
+class NominatimClient:
+    def __init__(self, url=NOMINATIM_URL, user_agent='github-country-lookup', throttle=None, timeout=10):
+        self.url = url
+        self.user_agent = user_agent
+        self.throttle = throttle
+        self.timeout = timeout
+        self.calls = 0
+
+    def country(self, location):
+        """Nome do país como o Nominatim devolve, '' se não encontrou; exceção se a consulta falhou."""
+        if self.throttle:
+            self.throttle.wait(self.url, stage='geocoding')
+        self.calls += 1
+        resp = requests.get(
+            self.url,
+            params={'q': location, 'format': 'json', 'addressdetails': 1, 'limit': 1},
+            headers={'User-Agent': self.user_agent},
+            timeout=self.timeout
+        )
+        resp.raise_for_status()
+        data = resp.json()
+        if data and len(data) > 0 and 'address' in data[0]:
+            return data[0]['address'].get('country', '')
+        return ''
+
+
+class Geocoder:
+    """Último recurso do identify_country: cache local, gazetteer offline e, por fim, o Nominatim."""
+
+    def __init__(self, normalize, cache=None, gazetteer=None, client=None):
+        self.normalize = normalize
+        self.cache = cache
+        self.gazetteer = gazetteer
+        self.client = client
+        self.resolved = {'cache': 0, 'gazetteer': 0, 'nominatim': 0, 'failed': 0}
+
+    def lookup(self, location):
+        if self.cache:
+            country = self.cache.get(location)
+            if country is not None:
+                self.resolved['cache'] += 1
+                return country
+        if self.gazetteer:
+            country = self.gazetteer.lookup(location)
+            if country:
+                country = self.normalize(country)
+                self.resolved['gazetteer'] += 1
+                if self.cache:
+                    self.cache.put(location, country, 'gazetteer')
+                return country
+        if not self.client:
+            return ''
+        try:
+            country = self.client.country(location)
+        except Exception:
+            # falha de rede não é gravada no cache: a próxima execução tenta de novo
+            self.resolved['failed'] += 1
+            return ''
+        country = self.normalize(country) if country else ''
+        self.resolved['nominatim'] += 1
+        if self.cache:
+            self.cache.put(location, country, 'nominatim')
+        return country
+
+    def summary(self):
+        return 'Geocodificação: ' + ', '.join(f'{k}={v}' for k, v in self.resolved.items())
@@ -0,0 +1,151 @@
+import json
+import os
+import time
+
+import requests
+
+from token_scheduler import is_rate_limited
+
+API_URL = os.environ.get('GITHUB_API_URL', 'https://api.github.com')
+GRAPHQL_URL = f'{API_URL}/graphql'
+USERS_BATCH_SIZE = 100
+# cada usuário custa duas buscas na query; lotes menores ficam abaixo do limite de custo
+CONTRIBUTIONS_BATCH_SIZE = 25
+
+
+def graphql_query(scheduler, query, variables=None, max_retries=3, throttle=None):
+    """POST na API GraphQL usando o TokenScheduler; devolve o JSON completo (data + errors) ou None."""
+    attempt = 0
+    while attempt < max_retries:
+        token = scheduler.acquire('graphql')
+        if not token:
+            # a API GraphQL não aceita chamadas anônimas
+            return None
+        if throttle:
+            throttle.wait(GRAPHQL_URL)
+        try:
+            r = requests.post(
+                GRAPHQL_URL,
+                json={'query': query, 'variables': variables or {}},
+                headers={'Authorization': f'bearer {token}'},
+                timeout=60
+            )
+            scheduler.update(token, r, 'graphql')
+            if is_rate_limited(r):
+                continue
+            if r.status_code in (502, 503, 504):
+                attempt += 1
+                time.sleep(2 ** attempt)
+                continue
+            r.raise_for_status()
+            return r.json()
+        except (requests.exceptions.SSLError,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout):
+            attempt += 1
+            time.sleep(5)
+    return None
+
+
+def build_users_query(logins):
+    fields = [
+        f'u{i}: user(login: {json.dumps(login)}) {{ login location url }}'
+        for i, login in enumerate(logins)
+    ]
+    return 'query {\n  ' + '\n  '.join(fields) + '\n}'
+
+
+def fetch_users_batch(scheduler, logins, throttle=None):
+    """Busca login/location/html_url de vários usuários numa única query com aliases.
+
+    Devolve {login: (profile_url, location)} só para os logins resolvidos; os demais
+    (bots, contas removidas, erros) ficam de fora para o chamador usar o REST.
+    """
+    if not logins:
+        return {}
+    result = graphql_query(scheduler, build_users_query(logins), throttle=throttle)
+    if not result or not result.get('data'):
+        return {}
+    found = {}
+    for i, login in enumerate(logins):
+        user = result['data'].get(f'u{i}')
+        if user:
+            found[login] = (user.get('url', ''), user.get('location') or '')
+    return found
+
+
+def fetch_users(scheduler, logins, fetch_user, throttle=None):
+    """Mesma saída de fetch_user (login, profile_url, location), em lotes de USERS_BATCH_SIZE."""
+    rows = []
+    for start in range(0, len(logins), USERS_BATCH_SIZE):
+        batch = logins[start:start + USERS_BATCH_SIZE]
+        found = fetch_users_batch(scheduler, batch, throttle)
+        for login in batch:
+            if login in found:
+                profile_url, location = found[login]
+                rows.append((login, profile_url, location))
+            else:
+                rows.append(fetch_user(login))
+    return rows
+
+
+def build_contributions_query(owner, repo, logins):
+    fields = []
+    for i, login in enumerate(logins):
+        prs = json.dumps(f'repo:{owner}/{repo} type:pr author:{login}')
+        issues = json.dumps(f'repo:{owner}/{repo} type:issue author:{login}')
+        fields.append(f'p{i}: search(query: {prs}, type: ISSUE, first: 1) {{ issueCount }}')
+        fields.append(f'i{i}: search(query: {issues}, type: ISSUE, first: 1) {{ issueCount }}')
+        fields.append(f'u{i}: user(login: {json.dumps(login)}) {{ id }}')
+    return 'query {\n  ' + '\n  '.join(fields) + '\n}'
+
+
+def build_commit_counts_query(owner, repo, user_ids):
+    fields = [
+        f'c{i}: history(author: {{id: {json.dumps(user_id)}}}) {{ totalCount }}'
+        for i, user_id in enumerate(user_ids)
+    ]
+    return (
+        f'query {{\n  repository(owner: {json.dumps(owner)}, name: {json.dumps(repo)}) {{\n'
+        '    defaultBranchRef { target { ... on Commit {\n      '
+        + '\n      '.join(fields)
+        + '\n    } } }\n  }\n}'
+    )
+
+
+def fetch_contributions_batch(scheduler, owner, repo, logins, throttle=None):
+    """PRs abertos, issues abertas e commits (branch padrão) de vários autores num repositório.
+
+    Duas queries por lote em vez de três chamadas à /search por usuário. Devolve
+    {login: {'prs_opened', 'issues_opened', 'commits_total'}} só para os logins
+    resolvidos por completo; os demais ficam para o chamador usar o REST.
+    """
+    if not logins:
+        return {}
+    result = graphql_query(scheduler, build_contributions_query(owner, repo, logins), throttle=throttle)
+    if not result or not result.get('data'):
+        return {}
+    data = result['data']
+    counts = {}
+    ids = {}
+    for i, login in enumerate(logins):
+        prs, issues, user = data.get(f'p{i}'), data.get(f'i{i}'), data.get(f'u{i}')
+        if prs is None or issues is None or not user:
+            continue
+        counts[login] = {'prs_opened': prs['issueCount'], 'issues_opened': issues['issueCount']}
+        ids[login] = user['id']
+    if not ids:
+        return {}
+    resolved = list(ids)
+    result = graphql_query(scheduler, build_commit_counts_query(owner, repo, [ids[l] for l in resolved]), throttle=throttle)
+    repository = ((result or {}).get('data') or {}).get('repository') or {}
+    target = (repository.get('defaultBranchRef') or {}).get('target')
+    if target is None:
+        # repositório vazio ou query recusada: sem commits não há linha completa
+        return {}
+    found = {}
+    for i, login in enumerate(resolved):
+        history = target.get(f'c{i}')
+        if history is not None:
+            found[login] = dict(counts[login], commits_total=history['totalCount'])
+    return found
@@ -0,0 +1,196 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlencode
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from token_scheduler import is_rate_limited, resource_for
+
+CACHE_PATH = os.environ.get('GITHUB_CACHE_PATH', 'github_cache.sqlite')
+TTL = 3600                      # segundos em que a resposta é servida sem ir à rede
+MAX_AGE = 7 * 24 * 3600         # depois disso a entrada é descartada
+MAX_BYTES = 512 * 1024 * 1024
+
+
+class CachedResponse:
+    """Resposta servida do disco com a mesma interface usada pelos scripts (requests.Response)."""
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict(headers)
+        self.content = content
+        self.from_cache = True
+
+    @property
+    def text(self):
+        return self.content.decode('utf-8', errors='replace')
+
+    def json(self):
+        return json.loads(self.content)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f'{self.status_code} for url: {self.url}', response=self)
+
+
+class ResponseCache:
+    """Cache persistente (SQLite) de respostas da API com revalidação por ETag/Last-Modified."""
+
+    def __init__(self, path=CACHE_PATH, ttl=TTL, max_age=MAX_AGE, max_bytes=MAX_BYTES):
+        self.ttl = ttl
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            ' key TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB,'
+            ' etag TEXT, last_modified TEXT, fetched_at REAL, accessed_at REAL, size INTEGER)'
+        )
+        self._conn.execute('DELETE FROM responses WHERE fetched_at < ?', (time.time() - max_age,))
+        self._conn.commit()
+        self._size = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        self.fresh_hits = 0
+        self.not_modified = 0
+        self.network_calls = 0
+        self.throttle = None
+
+    @staticmethod
+    def key(url, params=None):
+        if not params:
+            return url
+        return url + ('&' if '?' in url else '?') + urlencode(sorted(params.items()))
+
+    def lookup(self, key):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, headers, body, etag, last_modified, fetched_at FROM responses WHERE key = ?',
+                (key,)
+            ).fetchone()
+        if row is None:
+            return None
+        status, headers, body, etag, last_modified, fetched_at = row
+        if time.time() - fetched_at > self.max_age:
+            return None
+        return {
+            'status': status, 'headers': json.loads(headers), 'body': body,
+            'etag': etag, 'last_modified': last_modified, 'fetched_at': fetched_at,
+        }
+
+    def store(self, key, status, headers, body):
+        headers = dict(headers)
+        now = time.time()
+        size = len(body) + len(key)
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM responses WHERE key = ?', (key,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, status, json.dumps(headers), body, headers.get('ETag') or headers.get('etag'),
+                 headers.get('Last-Modified') or headers.get('last-modified'), now, now, size)
+            )
+            self._size += size - (old[0] if old else 0)
+            if self._size > self.max_bytes:
+                self._evict()
+            self._conn.commit()
+
+    def touch(self, key):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('UPDATE responses SET fetched_at = ?, accessed_at = ? WHERE key = ?', (now, now, key))
+            self._conn.commit()
+
+    def _evict(self):
+        # remove as entradas menos usadas até ficar em 90% do limite
+        target = self.max_bytes * 0.9
+        rows = self._conn.execute('SELECT key, size FROM responses ORDER BY accessed_at').fetchall()
+        for key, size in rows:
+            if self._size <= target:
+                break
+            self._conn.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self._size -= size
+
+    def fresh(self, url, params=None):
+        """Resposta do disco ainda dentro do TTL, ou None. Não vai à rede: quem chama só
+        precisa pegar um token do TokenScheduler quando isto devolve None."""
+        key = self.key(url, params)
+        entry = self.lookup(key)
+        if entry is None or time.time() - entry['fetched_at'] > self.ttl:
+            return None
+        self.fresh_hits += 1
+        return CachedResponse(key, entry['status'], entry['headers'], entry['body'])
+
+    def request(self, scheduler, url, params=None, timeout=None):
+        """GET autenticado com o cache na frente: resposta fresca do disco sem pegar token;
+        senão um token do scheduler, GET condicional e scheduler.update, repetindo enquanto a
+        resposta for de limite de taxa. Erros de rede e status de erro ficam com quem chama."""
+        cached = self.fresh(url, params)
+        if cached is not None:
+            return cached
+        resource = resource_for(url)
+        while True:
+            token = scheduler.acquire(resource)
+            headers = {'Authorization': f'token {token}'} if token else {}
+            r = self.get(url, params=params, headers=headers, timeout=timeout)
+            scheduler.update(token, r, resource)
+            if not is_rate_limited(r):
+                return r
+
+    def _prepare(self, url, params, headers):
+        key = self.key(url, params)
+        entry = self.lookup(key)
+        headers = dict(headers or {})
+        if entry is not None:
+            if time.time() - entry['fetched_at'] <= self.ttl:
+                self.fresh_hits += 1
+                return key, entry, headers, True
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        return key, entry, headers, False
+
+    def get(self, url, params=None, headers=None, timeout=None):
+        key, entry, headers, fresh = self._prepare(url, params, headers)
+        if fresh:
+            return CachedResponse(key, entry['status'], entry['headers'], entry['body'])
+        if self.throttle:
+            self.throttle.wait(url)
+        r = requests.get(url, headers=headers, params=params, timeout=timeout)
+        self.network_calls += 1
+        if r.status_code == 304 and entry is not None:
+            self.not_modified += 1
+            self.touch(key)
+            return CachedResponse(key, entry['status'], entry['headers'], entry['body'])
+        if r.status_code == 200:
+            self.store(key, r.status_code, r.headers, r.content)
+        return r
+
+    async def aget(self, session, url, headers=None, timeout=None):
+        key, entry, headers, fresh = self._prepare(url, None, headers)
+        if fresh:
+            return CachedResponse(key, entry['status'], entry['headers'], entry['body'])
+        if self.throttle:
+            await self.throttle.wait_async(url)
+        async with session.get(url, headers=headers, timeout=timeout) as resp:
+            body = await resp.read()
+            self.network_calls += 1
+            if resp.status == 304 and entry is not None:
+                self.not_modified += 1
+                self.touch(key)
+                return CachedResponse(key, entry['status'], entry['headers'], entry['body'])
+            if resp.status == 200:
+                self.store(key, resp.status, resp.headers, body)
+            response = CachedResponse(key, resp.status, resp.headers, body)
+            response.from_cache = False
+            return response
+
+    def summary(self):
+        spent = self.network_calls - self.not_modified
+        return (f"Cache HTTP: {self.fresh_hits} do disco, {self.not_modified} revalidadas (304), "
+                f"{spent} chamadas à API consumidas")
@@ -0,0 +1,73 @@
+import csv
+import io
+import json
+import os
+import threading
+
+
+class IncrementalCSV:
+    """CSV só de acréscimo, gravado por unidade (um repositório, um usuário...).
+
+    commit(key, rows) escreve apenas as linhas novas e, depois do flush, registra a
+    chave e o tamanho do arquivo em `<path>.done`. Ao reabrir, o CSV é cortado no
+    último commit registrado (linhas de uma unidade interrompida no meio somem) e
+    `done` diz quais entradas já podem ser puladas. Depois que a saída final foi gravada
+    sem falhas, discard() apaga os dois arquivos: a próxima execução começa do zero.
+    """
+
+    def __init__(self, path, fieldnames, resume=True):
+        self.path = path
+        self.done_path = f'{path}.done'
+        self.fieldnames = fieldnames
+        self.done = set()
+        self._lock = threading.Lock()
+        end = 0
+        if resume and os.path.exists(self.path) and os.path.exists(self.done_path):
+            with open(self.done_path, encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break
+                    self.done.add(record['key'])
+                    end = record['end']
+        if not self.done:
+            end = 0
+            open(self.done_path, 'w').close()
+        self._file = open(self.path, 'ab')
+        self._file.truncate(end)
+        self._file.seek(end)
+        if end == 0:
+            self._file.write(self._encode([dict(zip(fieldnames, fieldnames))]))
+            self._file.flush()
+        self._done_file = open(self.done_path, 'a', encoding='utf-8')
+
+    def _encode(self, rows):
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=self.fieldnames, extrasaction='ignore', lineterminator='\n')
+        writer.writerows(rows)
+        return buffer.getvalue().encode('utf-8')
+
+    def commit(self, key, rows):
+        with self._lock:
+            self._file.write(self._encode(rows))
+            self._file.flush()
+            self._done_file.write(json.dumps({'key': key, 'end': self._file.tell()}) + '\n')
+            self._done_file.flush()
+            self.done.add(key)
+
+    def close(self):
+        self._file.close()
+        self._done_file.close()
+
+    def discard(self):
+        self.close()
+        for path in (self.path, self.done_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,112 @@
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from storage import csv_names, read_frame
+
+# Carregador único dos CSVs/Parquets do pipeline: strings repetidas viram categorias,
+# contadores vão para o menor inteiro que cabe e datas são convertidas uma vez só.
+# Uso: python loaders.py bench users_metrics.csv [repetições]
+
+CATEGORY_COLUMNS = {
+    'repo_name', 'repo_url', 'repo_owner', 'full_name', 'login', 'profile_url', 'location', 'country',
+    'language_primary', 'author', 'reviewers_requested',
+}
+DATE_COLUMNS = {'opened_at', 'merged_at', 'closed_at', 'created_at', 'updated_at'}
+CHUNK_ROWS = 100_000
+
+
+def optimize(df):
+    """Aplica as conversões no lugar das colunas (o DataFrame é devolvido para encadear)."""
+    for name in df.columns:
+        column = df[name]
+        if name in DATE_COLUMNS:
+            if not pd.api.types.is_datetime64_any_dtype(column):
+                df[name] = pd.to_datetime(column, utc=True, errors='coerce', format='mixed')
+        elif name in CATEGORY_COLUMNS:
+            if not isinstance(column.dtype, pd.CategoricalDtype):
+                df[name] = column.astype('category')
+        elif pd.api.types.is_integer_dtype(column):
+            df[name] = pd.to_numeric(column, downcast='integer')
+    return df
+
+
+def load_frame(path, columns=None):
+    """DataFrame enxuto de um CSV ou .parquet do pipeline; `columns` limita o que é lido."""
+    if path.endswith('.parquet'):
+        return optimize(read_frame(path, columns))
+    # em blocos: o pico de memória é um bloco em texto, não o arquivo inteiro. As colunas de
+    # categoria são lidas como texto: um bloco todo vazio ou só com números viraria float/int e
+    # as categorias dos blocos deixariam de ter o mesmo tipo
+    options = {'usecols': columns, 'dtype': {name: str for name in CATEGORY_COLUMNS}}
+    names = csv_names(path)
+    if names:
+        # cabeçalho mais curto que as linhas: sem os nomes, o pandas faria das primeiras colunas o índice
+        options.update(header=0, names=names)
+    chunks = [optimize(chunk) for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS, **options)]
+    if not chunks:
+        return optimize(pd.read_csv(path, **options))
+    # categorias de blocos diferentes precisam ser unidas, senão o concat volta para texto
+    return pd.DataFrame({
+        name: union_categoricals([chunk[name] for chunk in chunks])
+        if isinstance(chunks[0][name].dtype, pd.CategoricalDtype)
+        else pd.concat([chunk[name] for chunk in chunks], ignore_index=True)
+        for name in chunks[0].columns
+    })
+
+
+def _measure(mode, path):
+    started = time.perf_counter()
+    df = read_frame(path) if mode == 'pandas' else load_frame(path)
+    elapsed = time.perf_counter() - started
+    return {
+        'seconds': elapsed,
+        'frame_mb': df.memory_usage(deep=True).sum() / 2 ** 20,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'rows': len(df),
+    }
+
+
+def bench(path, repeat=1):
+    """Carga padrão do pandas x load_frame, cada uma num processo novo (pico de RSS separado)."""
+    source = path
+    if repeat > 1:
+        # simula o crescimento do conjunto repetindo as linhas
+        df = pd.read_csv(path)
+        handle, source = tempfile.mkstemp(suffix=os.path.splitext(path)[1] or '.csv')
+        os.close(handle)
+        pd.concat([df] * repeat, ignore_index=True).to_csv(source, index=False)
+    try:
+        baseline_rss = json.loads(subprocess.run(
+            [sys.executable, '-c', 'import resource, pandas; print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)'],
+            capture_output=True, text=True, check=True
+        ).stdout)
+        print(f"{os.path.basename(path)} x{repeat}: pico de RSS só com pandas importado: {baseline_rss:.0f} MB")
+        for mode in ('pandas', 'load_frame'):
+            result = json.loads(subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '_measure', mode, source],
+                capture_output=True, text=True, check=True
+            ).stdout)
+            print(f"  {mode:<11} {result['rows']:>9} linhas  {result['seconds'] * 1000:>8.0f} ms  "
+                  f"DataFrame {result['frame_mb']:>7.1f} MB  pico RSS {result['peak_rss_mb']:>7.0f} MB")
+    finally:
+        if source != path:
+            os.remove(source)
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == '_measure':
+        print(json.dumps(_measure(sys.argv[2], sys.argv[3])))
+    elif command == 'bench' and len(sys.argv) > 2:
+        bench(sys.argv[2], int(sys.argv[3]) if len(sys.argv) > 3 else 1)
+    else:
+        print('uso: python loaders.py bench <csv|parquet> [repetições]')
+        sys.exit(1)
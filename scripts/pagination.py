@@ -0,0 +1,104 @@
+import asyncio
+from collections import deque
+from urllib.parse import parse_qs, urlparse
+
+
+def last_page(link_header):
+    """Número da última página a partir do cabeçalho Link (rel="last"), ou None."""
+    if not link_header:
+        return None
+    for link in link_header.split(','):
+        if 'rel="last"' in link:
+            url = link.split(';')[0].strip()[1:-1]
+            page = parse_qs(urlparse(url).query).get('page')
+            if page:
+                return int(page[0])
+    return None
+
+
+class IncompletePages(Exception):
+    """Alguma página não veio; quem grava uma marca d'água não pode aceitar o resultado parcial."""
+
+
+def fetch_pages(request, url, params=None, executor=None, per_page=100, max_pages=None, strict=False):
+    """Busca a página 1 e, sabendo pelo Link quantas existem, as demais em paralelo no executor.
+
+    request(url, params) deve devolver uma resposta (requests.Response/CachedResponse) ou None.
+    Devolve a lista de páginas (listas JSON) na ordem. Páginas que falham são puladas, a não
+    ser com strict=True, que levanta IncompletePages.
+    """
+    params = dict(params or {}, per_page=per_page)
+    first = request(url, dict(params, page=1))
+    data = first.json() if first is not None else None
+    if not isinstance(data, list):
+        if strict:
+            raise IncompletePages(f'{url}: página 1 não veio')
+        return []
+    if not data:
+        return []
+    pages = [data]
+    last = last_page(first.headers.get('Link'))
+    if last is None or len(data) < per_page:
+        return pages
+    if max_pages:
+        last = min(last, max_pages)
+
+    def fetch(page):
+        r = request(url, dict(params, page=page))
+        return r.json() if r is not None else None
+
+    results = executor.map(fetch, range(2, last + 1)) if executor else map(fetch, range(2, last + 1))
+    for page, data in enumerate(results, start=2):
+        if isinstance(data, list):
+            if data:
+                pages.append(data)
+        elif strict:
+            raise IncompletePages(f'{url}: página {page} não veio')
+    return pages
+
+
+async def iter_pages(request, url, params=None, per_page=100, max_pages=None, concurrency=4, strict=False):
+    """Versão assíncrona de fetch_pages que entrega as páginas uma a uma, na ordem.
+
+    request(url, params) é uma corrotina que devolve a resposta ou None. Depois da
+    página 1, busca só as páginas que o Link diz existir (até max_pages), no máximo
+    `concurrency` de cada vez; se o consumidor parar antes, as buscas pendentes são canceladas.
+    Com strict=True, página que falha levanta IncompletePages em vez de ser pulada.
+    """
+    params = dict(params or {}, per_page=per_page)
+    first = await request(url, dict(params, page=1))
+    data = first.json() if first is not None else None
+    if not isinstance(data, list):
+        if strict:
+            raise IncompletePages(f'{url}: página 1 não veio')
+        return
+    if not data:
+        return
+    yield data
+    last = last_page(first.headers.get('Link'))
+    if last is None or len(data) < per_page:
+        return
+    if max_pages:
+        last = min(last, max_pages)
+
+    async def fetch(page):
+        r = await request(url, dict(params, page=page))
+        return r.json() if r is not None else None
+
+    pending = deque()
+    next_page = 2
+    try:
+        while next_page <= last or pending:
+            while next_page <= last and len(pending) < concurrency:
+                pending.append((next_page, asyncio.ensure_future(fetch(next_page))))
+                next_page += 1
+            page, task = pending.popleft()
+            data = await task
+            if isinstance(data, list):
+                if data:
+                    yield data
+            elif strict:
+                raise IncompletePages(f'{url}: página {page} não veio')
+    finally:
+        for _, task in pending:
+            task.cancel()
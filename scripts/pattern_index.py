@@ -0,0 +1,52 @@
+from collections import deque
+
+
+class PatternAutomaton:
+    """Autômato de Aho–Corasick: encontra todas as ocorrências de um conjunto de
+    substrings numa única passada pela string (inclusive padrões sobrepostos)."""
+
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [frozenset()]
+        outputs = [set()]
+        for pattern in patterns:
+            if not pattern:
+                continue
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    outputs.append(set())
+                state = nxt
+            outputs[state].add(pattern)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0) if self._goto[fail].get(ch, 0) != nxt else 0
+                outputs[nxt] |= outputs[self._fail[nxt]]
+        self._out = [frozenset(o) for o in outputs]
+
+    def find_all(self, text):
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        state = 0
+        hits = set()
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                hits |= out[state]
+        return hits
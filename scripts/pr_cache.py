@@ -0,0 +1,240 @@
+import asyncio
+import json
+import os
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+from event_store import recent_prs, user_pr_metrics
+from loaders import load_frame
+
+DISK_MAX_AGE = 7 * 24 * 3600         # depois disso os PRs do repositório são buscados de novo
+DISK_MAX_BYTES = 256 * 1024 * 1024
+PRS_RAW_COLUMNS = ['repo_name', 'pr_number', 'author', 'reviewers_requested', 'opened_at', 'merged_at', 'closed_at']
+
+
+def iso(column):
+    # load_frame devolve as datas do prs_raw.csv em UTC; o cache guarda no formato da API
+    return column.dt.strftime('%Y-%m-%dT%H:%M:%SZ').fillna('')
+
+
+def text(value):
+    # colunas vindas do pandas trazem NaN no lugar de NULL
+    return value if isinstance(value, str) else ''
+
+
+def normalize_pr(pr):
+    user = pr.get('user') or {}
+    return {
+        'number': pr.get('number'),
+        'author': user.get('login', ''),
+        'reviewers': [r['login'] for r in pr.get('requested_reviewers') or [] if r.get('login')],
+        'created_at': pr.get('created_at') or '',
+        'merged_at': pr.get('merged_at') or '',
+        'closed_at': pr.get('closed_at') or '',
+    }
+
+
+ZERO_STATS = {'prs_merged': 0, 'avg_time_to_merge': 0, 'pr_requested_as_reviewer_rate': 0}
+PR_FIELDS = ['number', 'author', 'reviewers', 'created_at', 'merged_at', 'closed_at']
+
+
+def split_user_metrics(metrics):
+    """Saída de user_pr_metrics -> {repo: {login: métricas}}."""
+    table = metrics.reset_index()
+    result = {}
+    for repo, login, *values in zip(*(table[column] for column in ['repo', 'login', *ZERO_STATS])):
+        result.setdefault(repo, {})[login] = dict(zip(ZERO_STATS, values))
+    return result
+
+
+def build_user_index(prs):
+    """login -> métricas de PR de um repositório, pela mesma agregação do EventStore."""
+    if not prs:
+        return {}
+    frame = pd.DataFrame(prs, columns=PR_FIELDS)
+    frame['reviewers'] = frame['reviewers'].map(','.join)
+    return split_user_metrics(user_pr_metrics(frame.assign(repo=''))).get('', {})
+
+
+class PRCache:
+    """Lista de PRs por repositório, baixada uma única vez e compartilhada entre usuários.
+
+    Em memória ficam os max_repos usados mais recentemente; no disco (cache_dir), um .json por
+    repositório, descartado depois de max_age segundos e apagado do menos acessado para o mais
+    quando o diretório passa de max_bytes. O mtime do arquivo é a data da busca e o atime, o
+    último acesso.
+    """
+
+    def __init__(self, max_repos=256, cache_dir=None, max_age=DISK_MAX_AGE, max_bytes=DISK_MAX_BYTES):
+        self.max_repos = max_repos
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._locks = {}
+        self.hits = 0
+        self.misses = 0
+        self._disk_size = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            self._disk_size = sum(size for _, _, size in self._disk_files())
+
+    def _disk_path(self, full_name):
+        return os.path.join(self.cache_dir, full_name.replace('/', '__') + '.json')
+
+    def _disk_files(self):
+        files = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.cache_dir, name)
+                stat = os.stat(path)
+                files.append((stat.st_atime, path, stat.st_size))
+        return files
+
+    def _remove(self, path):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        self._disk_size -= size
+
+    def _evict(self):
+        # remove os arquivos menos acessados até ficar em 90% do limite
+        target = self.max_bytes * 0.9
+        for _, path, _ in sorted(self._disk_files()):
+            if self._disk_size <= target:
+                break
+            self._remove(path)
+
+    def _remember(self, full_name, prs, index=None):
+        entry = {'prs': prs, 'index': build_user_index(prs) if index is None else index}
+        self._entries[full_name] = entry
+        self._entries.move_to_end(full_name)
+        while len(self._entries) > self.max_repos:
+            self._entries.popitem(last=False)
+        return entry
+
+    def put(self, full_name, prs, index=None):
+        """Guarda a lista completa de PRs; quem buscou da API só chama depois de todas as páginas.
+        `index` (login -> métricas) evita recalcular quando já veio agregado de vários repositórios."""
+        entry = self._remember(full_name, prs, index)
+        if self.cache_dir:
+            path = self._disk_path(full_name)
+            self._remove(path)
+            # grava em outro arquivo e troca: uma interrupção não deixa JSON pela metade
+            with open(f'{path}.tmp', 'w', encoding='utf-8') as f:
+                json.dump(prs, f)
+            os.replace(f'{path}.tmp', path)
+            self._disk_size += os.path.getsize(path)
+            if self._disk_size > self.max_bytes:
+                self._evict()
+        return entry
+
+    def _load_disk(self, full_name):
+        path = self._disk_path(full_name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        now = time.time()
+        if now - stat.st_mtime > self.max_age:
+            self._remove(path)
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                prs = json.load(f)
+        except ValueError:
+            self._remove(path)
+            return None
+        # atime explícito: o LRU não depende de o sistema de arquivos atualizar o atime sozinho
+        os.utime(path, (now, stat.st_mtime))
+        return prs
+
+    def get(self, full_name):
+        entry = self._entries.get(full_name)
+        if entry is not None:
+            self._entries.move_to_end(full_name)
+            return entry
+        if self.cache_dir:
+            prs = self._load_disk(full_name)
+            if prs is not None:
+                return self._remember(full_name, prs)
+        return None
+
+    async def get_or_fetch(self, full_name, fetch_pages):
+        """fetch_pages() devolve um iterador assíncrono de páginas de PRs da API; cada
+        página é reduzida com normalize_pr assim que chega. O iterador deve levantar se uma
+        página falhar (iter_pages com strict=True): só uma lista completa entra no cache."""
+        entry = self.get(full_name)
+        if entry is not None:
+            self.hits += 1
+            return entry
+        lock = self._locks.setdefault(full_name, asyncio.Lock())
+        async with lock:
+            entry = self.get(full_name)
+            if entry is not None:
+                self.hits += 1
+                return entry
+            self.misses += 1
+            prs = [normalize_pr(pr) async for page in fetch_pages() for pr in page]
+            return self.put(full_name, prs)
+
+    def load_prs_raw(self, path, repo_urls):
+        """Carrega o prs_raw.csv gerado pelo script_prs_data; repo_urls mapeia repo_name -> repo_url."""
+        if not os.path.exists(path):
+            return 0
+        frame = load_frame(path, columns=PRS_RAW_COLUMNS)
+        full_names = {name: url.replace('https://github.com/', '').strip('/') for name, url in repo_urls.items()}
+        frame = frame[frame['repo_name'].isin(full_names)]
+        # mesmas colunas do EventStore.prs, para a agregação ser uma só para os dois caminhos
+        prs = pd.DataFrame({
+            'repo': frame['repo_name'].astype(str).map(full_names),
+            'number': frame['pr_number'],
+            'author': frame['author'].astype(object).fillna(''),
+            'reviewers': frame['reviewers_requested'].astype(object).fillna(''),
+            'created_at': iso(frame['opened_at']),
+            'merged_at': iso(frame['merged_at']),
+            'closed_at': iso(frame['closed_at']),
+        })
+        prs = recent_prs(prs)
+        indexes = split_user_metrics(user_pr_metrics(prs))
+        by_repo = {}
+        for row in prs.itertuples(index=False):
+            by_repo.setdefault(row.repo, []).append({
+                'number': int(row.number) if pd.notna(row.number) else None,
+                'author': row.author,
+                'reviewers': [r for r in row.reviewers.split(',') if r],
+                'created_at': row.created_at,
+                'merged_at': row.merged_at,
+                'closed_at': row.closed_at,
+            })
+        for full_name, group in by_repo.items():
+            self.put(full_name, group, indexes.get(full_name, {}))
+        return len(by_repo)
+
+    def load_event_store(self, store, full_names):
+        """Carrega os PRs já sincronizados no EventStore (script1/script_prs_data), com as
+        métricas por usuário agregadas de uma vez para todos os repositórios (user_metrics).
+        Como no load_prs_raw, só entram os USER_PR_WINDOW PRs que a API também traria."""
+        prs = recent_prs(store.prs(full_names))
+        indexes = split_user_metrics(store.user_metrics(full_names))
+        for full_name, group in prs.groupby('repo'):
+            self.put(full_name, [
+                {
+                    'number': row.number,
+                    'author': text(row.author),
+                    'reviewers': [r for r in text(row.reviewers).split(',') if r],
+                    'created_at': text(row.created_at),
+                    'merged_at': text(row.merged_at),
+                    'closed_at': text(row.closed_at),
+                }
+                for row in group.itertuples()
+            ], indexes.get(full_name, {}))
+        return prs['repo'].nunique()
+
+    @staticmethod
+    def user_stats(entry, login):
+        return dict(entry['index'].get(login, ZERO_STATS))
@@ -0,0 +1,156 @@
+import math
+import time
+from datetime import date, timedelta
+
+from github_graphql import API_URL
+from pagination import IncompletePages
+
+# A busca do GitHub devolve no máximo 1000 resultados por consulta. Para ir além, o intervalo
+# de estrelas é dividido (e, numa contagem de estrelas só, o de criação) até cada fatia caber
+# nesse limite; as fatias são buscadas em paralelo e os repositórios juntados pelo id.
+
+SEARCH_URL = f'{API_URL}/search/repositories'
+RESULT_CAP = 1000
+PER_PAGE = 100
+FIRST_CREATED = date(2007, 10, 1)
+# uma busca que falhou (em geral o limite de 30 req/min) é repetida depois de uma pausa;
+# se ainda faltar alguma, a descoberta levanta em vez de devolver uma lista menor calada
+RETRY_ROUNDS = 2
+RETRY_PAUSE = 60
+
+
+def slice_query(stars, created=None):
+    query = f'stars:{stars[0]}..{stars[1]}'
+    if created:
+        query += f' created:{created[0].isoformat()}..{created[1].isoformat()}'
+    return query
+
+
+def search_page(request, query, page=1, per_page=PER_PAGE):
+    """JSON de uma página da busca (com total_count e items), ou None."""
+    r = request(SEARCH_URL, {'q': query, 'sort': 'stars', 'order': 'desc', 'per_page': per_page, 'page': page})
+    if r is None:
+        return None
+    data = r.json()
+    return data if 'items' in data else None
+
+
+def search_pages(request, executor, jobs):
+    """search_page(request, *job) para cada job em paralelo, na ordem dos jobs; as que falharem
+    são repetidas em até RETRY_ROUNDS rodadas e, se ainda faltar alguma, levanta IncompletePages."""
+    results = {}
+    for attempt in range(RETRY_ROUNDS + 1):
+        pending = [job for job in dict.fromkeys(jobs) if job not in results]
+        if not pending:
+            break
+        if attempt:
+            print(f"⚠️ {len(pending)} buscas falharam; nova tentativa em {RETRY_PAUSE}s")
+            time.sleep(RETRY_PAUSE)
+        for job, data in zip(pending, executor.map(lambda job: search_page(request, *job), pending)):
+            if data is not None:
+                results[job] = data
+    missing = [job for job in jobs if job not in results]
+    if missing:
+        raise IncompletePages(f"{len(missing)} buscas falharam, a primeira: {missing[0]}")
+    return [results[job] for job in jobs]
+
+
+def count(request, executor, queries):
+    return [data['total_count'] for data in search_pages(request, executor, [(query, 1, 1) for query in queries])]
+
+
+def star_floor(request, executor, max_repos, low, high, probes=8):
+    """Maior s em low..high com pelo menos `max_repos` repositórios em stars:>=s.
+
+    Busca k-ária: cada rodada consulta `probes` limiares em paralelo e fica com o trecho entre
+    o último que ainda tem repositórios suficientes e o primeiro que não tem.
+    """
+    while low < high:
+        step = (high - low) / (probes + 1)
+        points = sorted({min(high, low + max(1, round(step * i))) for i in range(1, probes + 1)})
+        totals = count(request, executor, [f'stars:>={s}' for s in points])
+        for point, total in zip(points, totals):
+            if total >= max_repos:
+                low = point
+            else:
+                high = point - 1
+                break
+    return low
+
+
+def split(stars, created):
+    """Duas metades da fatia, ou None se ela não pode mais ser dividida (um dia, uma contagem)."""
+    low, high = stars
+    if low < high:
+        # quase todos os repositórios têm poucas estrelas: corte geométrico, não aritmético
+        mid = min(max(int(math.sqrt(max(low, 1) * high)), low), high - 1)
+        return [((low, mid), created), ((mid + 1, high), created)]
+    start, end = created or (FIRST_CREATED, date.today())
+    if start < end:
+        mid = start + timedelta(days=(end - start).days // 2)
+        return [(stars, (start, mid)), (stars, (mid + timedelta(days=1), end))]
+    return None
+
+
+def partition(request, executor, low, high):
+    """Fatias [(query, primeira página)] que cobrem stars:low..high com até 1000 resultados cada.
+
+    Cada nível da divisão é consultado em paralelo; a página 1 (100 itens) serve de contagem e
+    já fica guardada para a coleta.
+    """
+    pending = [((low, high), None)]
+    slices = []
+    truncated = 0
+    while pending:
+        pages = search_pages(request, executor, [(slice_query(*s),) for s in pending])
+        next_level = []
+        for (stars, created), data in zip(pending, pages):
+            if not data['total_count']:
+                continue
+            halves = split(stars, created) if data['total_count'] > RESULT_CAP else None
+            if halves:
+                next_level.extend(halves)
+                continue
+            if data['total_count'] > RESULT_CAP:
+                truncated += data['total_count'] - RESULT_CAP
+            slices.append((slice_query(stars, created), data))
+        pending = next_level
+    if truncated:
+        print(f"⚠️ {truncated} repositórios ficaram além do limite de 1000 em fatias indivisíveis")
+    return slices
+
+
+def collect(request, executor, slices):
+    """Páginas restantes de cada fatia em paralelo; repositórios únicos por id."""
+    repos = {}
+    jobs = []
+    for query, first in slices:
+        for repo in first['items']:
+            repos[repo['id']] = repo
+        pages = math.ceil(min(first['total_count'], RESULT_CAP) / PER_PAGE)
+        jobs.extend((query, page) for page in range(2, pages + 1))
+    for data in search_pages(request, executor, jobs):
+        # um repositório que ganhou estrelas durante a coleta pode aparecer em duas fatias
+        for repo in data['items']:
+            repos[repo['id']] = repo
+    return repos
+
+
+def discover_repos(request, executor, max_repos=None, min_stars=1):
+    """Os `max_repos` repositórios com mais estrelas (todos com stars >= min_stars se None).
+
+    request(url, params) deve devolver uma resposta ou None; o executor limita quantas buscas
+    saem ao mesmo tempo (o limite da busca é por minuto, então poucos workers bastam). Uma busca
+    que continua falhando levanta IncompletePages: o corte de estrelas ou a lista sairiam errados.
+    """
+    top = search_pages(request, executor, [(f'stars:>={min_stars}', 1, 1)])[0]
+    if not top['items']:
+        return []
+    low, high = min_stars, top['items'][0]['stargazers_count']
+    if max_repos and top['total_count'] > max_repos:
+        low = star_floor(request, executor, max_repos, low, high)
+    slices = partition(request, executor, low, high)
+    repos = collect(request, executor, slices)
+    print(f"Busca: stars {low}..{high} em {len(slices)} fatias, {len(repos)} repositórios únicos")
+    ordered = sorted(repos.values(), key=lambda repo: (-repo['stargazers_count'], repo['id']))
+    return ordered[:max_repos] if max_repos else ordered
@@ -1,95 +1,66 @@
 
 
-import requests
+import pandas as pd
 import csv
+import json
+import os
+import threading
 import time
-from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-
-TOKENS = [
-]
-NUM_WORKERS = len(TOKENS) * 8
-
-def get_headers(token):
- return {'Authorization': f'token {token}'}
-
-def round_robin_tokens():
- while True:
-     for token in TOKENS:
-         yield token
-
-token_gen = round_robin_tokens()
+from http_cache import ResponseCache
+from token_scheduler import TokenScheduler, load_tokens
+from pagination import last_page
+from event_store import EventStore
+from first_response import average_first_response
+from sharding import in_shard
+
+TOKENS = load_tokens()
+NUM_WORKERS = max(len(TOKENS), 1) * 8
+METRIC_WORKERS = 32
+PAGE_WORKERS = 16
+CHECKPOINT_FILE = 'repos_metrics_checkpoint.jsonl'
+# valores mais velhos que isso são calculados de novo mesmo que o checkpoint tenha sobrado
+CHECKPOINT_MAX_AGE = 24 * 3600
+FIRST_RESPONSE_SAMPLE = 20
+
+scheduler = TokenScheduler(TOKENS)
+response_cache = ResponseCache()
+# pools separados: uma métrica nunca espera por uma página presa atrás dela na mesma fila
+metric_executor = ThreadPoolExecutor(max_workers=METRIC_WORKERS)
+page_executor = ThreadPoolExecutor(max_workers=PAGE_WORKERS)
+repo_latencies = []
+event_store = EventStore()
 
 def safe_request(url, params=None):
- for _ in range(len(TOKENS)):
-     token = next(token_gen)
-     headers = get_headers(token)
-     r = requests.get(url, headers=headers, params=params)
-     if r.status_code == 403 and 'rate limit' in r.text.lower():
-         continue
-     r.raise_for_status()
-     return r
- time.sleep(60)
- return safe_request(url, params)
+ r = response_cache.request(scheduler, url, params)
+ r.raise_for_status()
+ return r
 
 def get_prs_stats(owner, repo):
- prs_opened = prs_merged = 0
- time_to_merge = []
- page = 1
- while True:
-     url = f'https://api.github.com/repos/{owner}/{repo}/pulls'
-     params = {'state': 'all', 'per_page': 100, 'page': page}
-     r = safe_request(url, params)
-     prs = r.json()
-     if not prs or 'message' in prs:
-         break
-     for pr in prs:
-         prs_opened += 1
-         if pr.get('merged_at'):
-             prs_merged += 1
-             created = pr['created_at']
-             merged = pr['merged_at']
-             dt_created = datetime.strptime(created, '%Y-%m-%dT%H:%M:%SZ')
-             dt_merged = datetime.strptime(merged, '%Y-%m-%dT%H:%M:%SZ')
-             time_to_merge.append((dt_merged - dt_created).total_seconds() / 3600)
-     if len(prs) < 100:
-         break
-     page += 1
- avg_time_to_merge = round(sum(time_to_merge)/len(time_to_merge), 2) if time_to_merge else ''
- return prs_opened, prs_merged, avg_time_to_merge
-
-def get_commits_count(owner, repo):
- url = f'https://api.github.com/repos/{owner}/{repo}/commits?per_page=1'
+ full_name = f'{owner}/{repo}'
+ event_store.sync_prs(full_name, safe_request, executor=page_executor)
+ metrics = event_store.repo_metrics([full_name])
+ if full_name not in metrics.index:
+     return 0, 0, ''
+ row = metrics.loc[full_name]
+ avg_time_to_merge = '' if pd.isna(row['time_to_merge']) else row['time_to_merge']
+ return int(row['prs_opened']), int(row['prs_merged']), avg_time_to_merge
+
+def count_from_link(url):
  r = safe_request(url)
- if 'Link' in r.headers:
-     last_link = [l for l in r.headers['Link'].split(',') if 'rel="last"' in l]
-     if last_link:
-         last_url = last_link[0].split(';')[0].strip()[1:-1]
-         count = int(last_url.split('page=')[1].split('&')[0])
-         return count
+ count = last_page(r.headers.get('Link'))
+ if count is not None:
+     return count
  return len(r.json())
 
+def get_commits_count(owner, repo):
+ return count_from_link(f'https://api.github.com/repos/{owner}/{repo}/commits?per_page=1')
+
 def get_contributors_count(owner, repo):
- url = f'https://api.github.com/repos/{owner}/{repo}/contributors?per_page=1&anon=true'
- r = safe_request(url)
- if 'Link' in r.headers:
-     last_link = [l for l in r.headers['Link'].split(',') if 'rel="last"' in l]
-     if last_link:
-         last_url = last_link[0].split(';')[0].strip()[1:-1]
-         count = int(last_url.split('page=')[1].split('&')[0])
-         return count
- return len(r.json())
+ return count_from_link(f'https://api.github.com/repos/{owner}/{repo}/contributors?per_page=1&anon=true')
 
 def get_release_count(owner, repo):
- url = f'https://api.github.com/repos/{owner}/{repo}/releases?per_page=1'
- r = safe_request(url)
- if 'Link' in r.headers:
-     last_link = [l for l in r.headers['Link'].split(',') if 'rel="last"' in l]
-     if last_link:
-         last_url = last_link[0].split(';')[0].strip()[1:-1]
-         count = int(last_url.split('page=')[1].split('&')[0])
-         return count
- return len(r.json())
+ return count_from_link(f'https://api.github.com/repos/{owner}/{repo}/releases?per_page=1')
 
 def get_maintainers_count(owner, repo):
  url = f'https://api.github.com/repos/{owner}/{repo}/collaborators?per_page=100'
@@ -99,82 +70,122 @@ def get_maintainers_count(owner, repo):
  return ''
 
 def get_active_days(owner, repo):
- url = f'https://api.github.com/repos/{owner}/{repo}/commits?per_page=100'
- days = set()
- page = 1
- while page <= 10:
-     r = safe_request(url + f"&page={page}")
-     data = r.json()
-     if not data or 'message' in data:
-         break
-     for commit in data:
-         date = commit['commit']['author']['date'][:10]
-         days.add(date)
-     if len(data) < 100:
-         break
-     page += 1
- return len(days)
+ full_name = f'{owner}/{repo}'
+ event_store.sync_commits(full_name, safe_request, executor=page_executor)
+ metrics = event_store.repo_metrics([full_name])
+ if full_name not in metrics.index or pd.isna(metrics.loc[full_name, 'active_days']):
+     return 0
+ return int(metrics.loc[full_name, 'active_days'])
 
 def get_time_to_first_response(owner, repo):
- url = f'https://api.github.com/repos/{owner}/{repo}/issues?state=all&per_page=20'
- r = safe_request(url)
- issues = r.json()
- times = []
- for issue in issues:
-     if issue.get('comments', 0) > 0:
-         created = datetime.strptime(issue['created_at'], '%Y-%m-%dT%H:%M:%SZ')
-         comments_url = issue['comments_url']
-         rc = safe_request(comments_url)
-         comments = rc.json()
-         if comments:
-             first_comment = datetime.strptime(comments[0]['created_at'], '%Y-%m-%dT%H:%M:%SZ')
-             times.append((first_comment - created).total_seconds() / 3600)
- avg_time = round(sum(times)/len(times), 2) if times else ''
- return avg_time
-
-def process_repo_from_url(repo_url):
+ return average_first_response(safe_request, owner, repo, scheduler=scheduler if TOKENS else None,
+                               executor=page_executor, sample=FIRST_RESPONSE_SAMPLE)
+
+def get_repo_info(owner, repo):
+ r = safe_request(f'https://api.github.com/repos/{owner}/{repo}')
+ return r.json()
+
+METRICS = {
+ 'repo': get_repo_info,
+ 'prs': get_prs_stats,
+ 'commits': get_commits_count,
+ 'contributors': get_contributors_count,
+ 'releases': get_release_count,
+ 'maintainers': get_maintainers_count,
+ 'active_days': get_active_days,
+ 'first_response': get_time_to_first_response,
+}
+
+class MetricCheckpoint:
+ """Arquivo jsonl com uma linha por métrica calculada; numa nova execução só o que falta é recalculado.
+ Serve para retomar uma execução interrompida: linhas com mais de max_age segundos são ignoradas e o
+ arquivo é apagado quando todas as métricas de todos os repositórios saíram (discard)."""
+
+ def __init__(self, path, max_age=CHECKPOINT_MAX_AGE):
+     self.path = path
+     self.done = {}
+     if os.path.exists(path):
+         oldest = time.time() - max_age
+         with open(path, encoding='utf-8') as f:
+             for line in f:
+                 try:
+                     record = json.loads(line)
+                 except ValueError:
+                     continue
+                 if record.get('at', 0) < oldest:
+                     continue
+                 self.done.setdefault(record['repo_url'], {})[record['metric']] = record['value']
+     self._lock = threading.Lock()
+     self._file = open(path, 'a', encoding='utf-8')
+
+ def save(self, repo_url, metric, value):
+     with self._lock:
+         self._file.write(json.dumps({'repo_url': repo_url, 'metric': metric, 'value': value, 'at': time.time()}) + '\n')
+         self._file.flush()
+         self.done.setdefault(repo_url, {})[metric] = value
+
+ def complete(self, repo_urls):
+     return all(len(self.done.get(repo_url, {})) == len(METRICS) for repo_url in repo_urls)
+
+ def close(self):
+     self._file.close()
+
+ def discard(self):
+     self.close()
+     os.remove(self.path)
+
+def process_repo_from_url(repo_url, checkpoint=None):
+ started = time.time()
  try:
      parts = repo_url.rstrip('/').split('/')
      owner = parts[-2]
      name = parts[-1]
  except Exception as e:
      return None
- repo_api_url = f'https://api.github.com/repos/{owner}/{name}'
- try:
-     r = safe_request(repo_api_url)
-     repo = r.json()
- except Exception as e:
+ values = dict(checkpoint.done.get(repo_url, {})) if checkpoint else {}
+ # cada métrica é independente: disparadas juntas, o repo custa o tempo da mais lenta,
+ # e uma falha deixa vazia só a própria célula
+ futures = {
+     metric: metric_executor.submit(func, owner, name)
+     for metric, func in METRICS.items() if metric not in values
+ }
+ failed = []
+ for metric, future in futures.items():
+     try:
+         values[metric] = future.result()
+     except Exception as e:
+         failed.append(metric)
+         continue
+     if checkpoint:
+         checkpoint.save(repo_url, metric, values[metric])
+ elapsed = time.time() - started
+ repo_latencies.append(elapsed)
+ print(f'{owner}/{name}: {elapsed:.1f}s, {len(futures) - len(failed)} calculadas'
+       + (f', falharam: {", ".join(failed)}' if failed else ''))
+
+ repo = values.get('repo')
+ if repo is None:
      return None
-
  description = (repo.get('description') or '').replace('\n', ' ').replace('\r', ' ')
- try:
-     prs_opened, prs_merged, avg_time_to_merge = get_prs_stats(owner, name)
-     commits_count = get_commits_count(owner, name)
-     contributors_count = get_contributors_count(owner, name)
-     release_count = get_release_count(owner, name)
-     maintainers_count = get_maintainers_count(owner, name)
-     active_days = get_active_days(owner, name)
-     time_to_first_response = get_time_to_first_response(owner, name)
- except Exception as e:
-     prs_opened = prs_merged = avg_time_to_merge = commits_count = contributors_count = release_count = maintainers_count = active_days = time_to_first_response = ''
+ prs_opened, prs_merged, avg_time_to_merge = values.get('prs', ('', '', ''))
  return [
      name, owner, repo.get('full_name', ''), repo_url, description, repo.get('created_at', ''), repo.get('updated_at', ''), repo.get('language', ''),
      ','.join(repo.get('topics', [])),
      repo.get('stargazers_count', ''), repo.get('forks_count', ''),
-     prs_opened, prs_merged, commits_count, contributors_count, active_days,
-     time_to_first_response, avg_time_to_merge, release_count, maintainers_count
+     prs_opened, prs_merged, values.get('commits', ''), values.get('contributors', ''), values.get('active_days', ''),
+     values.get('first_response', ''), avg_time_to_merge, values.get('releases', ''), values.get('maintainers', '')
  ]
 
-def main():
- input_csv = 'reposFinal.csv'
+def main(input_csv='reposFinal.csv', output_csv='repos_metrics.csv', shard=None):
  repos_urls = []
  with open(input_csv, newline='', encoding='utf-8') as f:
      reader = csv.DictReader(f)
      for row in reader:
          repo_url = row['repo_url']
-         repos_urls.append(repo_url)
+         if in_shard(repo_url, shard):
+             repos_urls.append(repo_url)
 
- with open('repos_metrics.csv', 'w', newline='', encoding='utf-8') as f:
+ with open(output_csv, 'w', newline='', encoding='utf-8') as f:
      writer = csv.writer(f)
      writer.writerow([
          'repo_name', 'repo_owner', 'full_name', 'repo_url', 'description', 'created_at', 'updated_at', 'language_primary', 'topics',
@@ -182,12 +193,23 @@ def main():
          'prs_opened_count', 'prs_merged_count', 'commits_count', 'contributors_count', 'active_days',
          'time_to_first_response', 'time_to_merge', 'release_count', 'maintainers_count'
      ])
+     checkpoint = MetricCheckpoint(CHECKPOINT_FILE)
      with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-         futures = [executor.submit(process_repo_from_url, repo_url) for repo_url in repos_urls]
+         futures = [executor.submit(process_repo_from_url, repo_url, checkpoint) for repo_url in repos_urls]
          for future in as_completed(futures):
              result = future.result()
              if result:
                  writer.writerow(result)
+     checkpoint.close()
+ # execução completa: a próxima é uma atualização e tem de ir à API, não ao checkpoint
+ if checkpoint.complete(repos_urls):
+     checkpoint.discard()
+ if repo_latencies:
+     latencies = sorted(repo_latencies)
+     pick = lambda q: latencies[min(int(q * len(latencies)), len(latencies) - 1)]
+     print(f'Latência por repo: p50={pick(0.5):.1f}s p90={pick(0.9):.1f}s p99={pick(0.99):.1f}s max={latencies[-1]:.1f}s')
+ print(response_cache.summary())
+ print(scheduler.summary())
 
 if __name__ == '__main__':
  main()
\ No newline at end of file
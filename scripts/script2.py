@@ -2,54 +2,68 @@
 
 import requests
 import csv
+import os
 import time
+import queue
+import threading
+from functools import lru_cache
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import pycountry
+from http_cache import ResponseCache
+from token_scheduler import TokenScheduler, load_tokens
+from github_graphql import API_URL, USERS_BATCH_SIZE, fetch_users
+from throttle import Throttle, default_limits
+from pattern_index import PatternAutomaton
+from geocoding import Geocoder, Gazetteer, LocationCache, NominatimClient
+from sharding import in_shard
 from unidecode import unidecode
 
-TOKENS = [
-]
+TOKENS = load_tokens()
 NUM_WORKERS = 8
+CONTRIBUTOR_WORKERS = 4
+USE_GRAPHQL = True
+LOGIN_QUEUE_SIZE = 1000
+BATCH_TIMEOUT = 0.5
+USE_GAZETTEER = False
+GEONAMES_PATH = os.environ.get('GEONAMES_PATH')
+_DONE = object()
 
 
-def get_headers(token):
-    return {'Authorization': f'token {token}'}
-
-
-def round_robin_tokens():
-    while True:
-        for token in TOKENS:
-            yield token
-
-token_gen = round_robin_tokens()
+scheduler = TokenScheduler(TOKENS)
+throttle = Throttle(default_limits(len(TOKENS)))
+response_cache = ResponseCache()
+response_cache.throttle = throttle
 
 
 def safe_request(url, params=None, max_retries=3):
-    for attempt in range(max_retries):
-        for _ in range(len(TOKENS)):
-            token = next(token_gen)
-            headers = get_headers(token)
-            try:
-                r = requests.get(url, headers=headers, params=params, timeout=30)
-                if r.status_code == 403 and 'rate limit' in r.text.lower():
-                    continue
-                r.raise_for_status()
-                return r
-            except (requests.exceptions.SSLError,
-                    requests.exceptions.ConnectionError,
-                    requests.exceptions.Timeout) as e:
-                print(f"Erro de conexão (tentativa {attempt + 1}/{max_retries}): {e}")
-                time.sleep(5)
-                continue
-        time.sleep(60)
+    attempt = 0
+    while attempt < max_retries:
+        try:
+            r = response_cache.request(scheduler, url, params, timeout=30)
+            if r.status_code == 404:
+                # conta removida: só esse login fica sem perfil, não o lote inteiro do fetch_users
+                return None
+            r.raise_for_status()
+            return r
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404:
+                return None
+            attempt += 1
+            print(f"Erro HTTP (tentativa {attempt}/{max_retries}): {e}")
+            time.sleep(2)
+        except (requests.exceptions.SSLError,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout) as e:
+            attempt += 1
+            print(f"Erro de conexão (tentativa {attempt}/{max_retries}): {e}")
+            time.sleep(5)
     return None
 
 
-def fetch_contributors(owner, repo):
-    contributors = []
+def fetch_contributor_pages(owner, repo):
     page = 1
     while True:
-        url = f'https://api.github.com/repos/{owner}/{repo}/contributors'
+        url = f'{API_URL}/repos/{owner}/{repo}/contributors'
         params = {'per_page': 100, 'page': page}
         r = safe_request(url, params)
         if r is None:
@@ -57,17 +71,37 @@ def fetch_contributors(owner, repo):
         data = r.json()
         if not data or 'message' in data:
             break
-        for user in data:
-            if 'login' in user:
-                contributors.append(user['login'])
+        yield [user['login'] for user in data if 'login' in user]
         if len(data) < 100:
             break
         page += 1
-    return contributors
+
+
+def fetch_contributors(owner, repo):
+    return [login for logins in fetch_contributor_pages(owner, repo) for login in logins]
+
+
+def stream_contributors(repos, login_queue):
+    """Produtor: pagina os contribuidores de vários repositórios em paralelo e
+    coloca (login, repo_name, repo_url) na fila limitada assim que cada página chega."""
+    def produce(repo):
+        with throttle.stage('contributors'):
+            for logins in fetch_contributor_pages(repo['owner'], repo['name']):
+                for login in logins:
+                    login_queue.put((login, repo['repo_name'], repo['repo_url']))
+
+    with ThreadPoolExecutor(max_workers=CONTRIBUTOR_WORKERS) as executor:
+        futures = {executor.submit(produce, repo): repo for repo in repos}
+        for future in as_completed(futures):
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Erro ao buscar contribuidores de {futures[future]['repo_name']}: {e}")
+    login_queue.put(_DONE)
 
 
 def fetch_user(login):
-    url = f'https://api.github.com/users/{login}'
+    url = f'{API_URL}/users/{login}'
     r = safe_request(url)
     if r is None:
         return login, '', ''
@@ -77,12 +111,27 @@ def fetch_user(login):
     return login, profile_url, location
 
 
+def fetch_user_batch(logins):
+    with throttle.stage('users'):
+        if USE_GRAPHQL:
+            return fetch_users(scheduler, logins, fetch_user, throttle)
+        return [fetch_user(login) for login in logins]
+
+
 country_names = {unidecode(c.name.lower()): c.name for c in pycountry.countries}
 country_alpha2 = {c.alpha_2.lower(): c.name for c in pycountry.countries}
 country_alpha3 = {c.alpha_3.lower(): c.name for c in pycountry.countries}
 country_official = {unidecode(getattr(c, 'official_name', '').lower()): c.name for c in pycountry.countries if hasattr(c, 'official_name')}
 country_all = {**country_names, **country_alpha2, **country_alpha3, **country_official}
 
+# nome normalizado (name, official_name, common_name, alpha_2, alpha_3) -> nome canônico;
+# em caso de colisão vale o primeiro país na ordem do pycountry
+country_index = {}
+for c in pycountry.countries:
+    for key in (c.name, getattr(c, 'official_name', ''), getattr(c, 'common_name', ''),
+                getattr(c, 'alpha_2', ''), getattr(c, 'alpha_3', '')):
+        country_index.setdefault(unidecode(key.lower()), c.name)
+
 INVALID_LOCATIONS = {
     'earth', 'world', 'internet', 'cyberspace', 'online', 'remote', 'global',
     'nowhere', 'somewhere', 'anywhere', 'everywhere', 'unknown', 'n/a', 'na',
@@ -185,47 +234,67 @@ country_aliases = {
 'bilbao': 'Spain', 'reykjavik': 'Iceland', 'reykjavík': 'Iceland',
 }
 
-
+CHINA_PATTERNS = ['in china', 'china.', 'china,', ' china ', 'province china', 'district china', ', china', 'china)']
+SPANISH_CITIES = ['madrid', 'barcelona', 'valencia', 'sevilla', 'seville', 'bilbao', 'malaga']
+SPANISH_CITY_MENTIONS = ['spain', 'españa', 'iceland', 'island', 'reykjavik', 'reykjavík']
+ICELANDIC_CITIES = ['reykjavik', 'reykjavík', 'akureyri', 'keflavik']
+ICELANDIC_CITY_MENTIONS = ['iceland', 'island', 'spain', 'españa']
+SCANDINAVIAN_COUNTRIES = ['denmark', 'sweden', 'norway', 'finland', 'iceland', 'danmark', 'sverige', 'norge', 'island']
+VALID_SHORT_LOCATIONS = ['us', 'uk', 'ca', 'de', 'fr', 'br', 'in', 'au', 'es', 'it', 'nl', 'ch', 'se', 'no', 'dk']
+
+# Todas as tabelas de substrings compiladas num único autômato na importação:
+# cada location é percorrida uma vez e as regras abaixo consultam o conjunto de ocorrências.
+REJECT_PATTERNS = frozenset(INVALID_LOCATIONS) | frozenset(SARCASTIC_PATTERNS) | frozenset(NATIVE_REGION_NAMES)
+UNDEFINED_PATTERNS = frozenset(SARCASTIC_PATTERNS) | frozenset(NATIVE_REGION_NAMES)
+# a primeira cidade/estado na ordem das tabelas é quem decide quando há mais de uma ocorrência
+SCANDINAVIAN_RANK = {city: i for i, city in enumerate(SCANDINAVIAN_CITIES)}
+STATE_CITY_RANK = {key: i for i, key in enumerate(state_city_country) if len(key) > 3}
+location_automaton = PatternAutomaton(
+    REJECT_PATTERNS
+    | frozenset(CHINA_PATTERNS + SPANISH_CITIES + SPANISH_CITY_MENTIONS + ICELANDIC_CITIES + ICELANDIC_CITY_MENTIONS)
+    | frozenset(SCANDINAVIAN_COUNTRIES) | frozenset(SCANDINAVIAN_RANK) | frozenset(STATE_CITY_RANK)
+    | {'province', 'district', 'china', 'montreal'}
+)
+
+
+@lru_cache(maxsize=65536)
+def location_hits(loc):
+    return frozenset(location_automaton.find_all(loc))
+
+
+@lru_cache(maxsize=4096)
 def normalize_country_name(country):
     if not country:
         return ''
     ctry = unidecode(country.strip().lower())
     if ctry in country_aliases:
         return country_aliases[ctry]
-    for c in pycountry.countries:
-        if ctry in [
-            unidecode(c.name.lower()),
-            unidecode(getattr(c, 'official_name', '').lower()),
-            unidecode(getattr(c, 'common_name', '').lower()),
-            unidecode(getattr(c, 'alpha_2', '').lower()),
-            unidecode(getattr(c, 'alpha_3', '').lower())
-        ]:
-            return c.name
+    if ctry in country_index:
+        return country_index[ctry]
     for alias, norm in country_aliases.items():
         if alias in ctry:
             return norm
     return country.capitalize()
 
 
+geocoder = Geocoder(
+    normalize_country_name,
+    cache=LocationCache(),
+    gazetteer=Gazetteer(GEONAMES_PATH) if USE_GAZETTEER else None,
+    client=NominatimClient(throttle=throttle)
+)
+
+
 def is_valid_location(location):
     if not location or len(location.strip()) < 2:
         return False
     
     loc_lower = unidecode(location.lower().strip())
     
-    for invalid in INVALID_LOCATIONS:
-        if invalid in loc_lower:
-            return False
-    
-    for pattern in SARCASTIC_PATTERNS:
-        if pattern in loc_lower:
-            return False
-    
-    for native in NATIVE_REGION_NAMES:
-        if native in loc_lower:
-            return False
+    if not REJECT_PATTERNS.isdisjoint(location_hits(loc_lower)):
+        return False
     
-    if len(loc_lower) <= 2 and loc_lower not in ['us', 'uk', 'ca', 'de', 'fr', 'br', 'in', 'au', 'es', 'it', 'nl', 'ch', 'se', 'no', 'dk']:
+    if len(loc_lower) <= 2 and loc_lower not in VALID_SHORT_LOCATIONS:
         return False
     if all(not c.isalpha() for c in loc_lower):
         return False
@@ -243,53 +312,35 @@ def identify_country(location):
     
     location_original = location
     loc = unidecode(location.strip().lower())
+    hits = location_hits(loc)
     
-    for pattern in SARCASTIC_PATTERNS:
-        if pattern in loc:
-            return ''
-    
-    for native in NATIVE_REGION_NAMES:
-        if native in loc:
-            return ''
-        
-    china_patterns = ['in china', 'china.', 'china,', ' china ', 'province china', 'district china', ', china', 'china)']
-    for pattern in china_patterns:
-        if pattern in loc:
-            
-            return 'China'
+    if not UNDEFINED_PATTERNS.isdisjoint(hits):
+        return ''
     
-   
-    spanish_cities = ['madrid', 'barcelona', 'valencia', 'sevilla', 'seville', 'bilbao', 'malaga']
-    for city in spanish_cities:
-        if city in loc:
-            country_count = sum(1 for c in ['spain', 'españa', 'iceland', 'island', 'reykjavik', 'reykjavík'] if c in loc)
-            if country_count > 1:
-                return ''  
-            return 'Spain'
+    if not hits.isdisjoint(CHINA_PATTERNS):
+        return 'China'
     
-    icelandic_cities = ['reykjavik', 'reykjavík', 'akureyri', 'keflavik']
-    for city in icelandic_cities:
-        if city in loc:
-            
-            country_count = sum(1 for c in ['iceland', 'island', 'spain', 'españa'] if c in loc)
-            if country_count > 1:
-                return '' 
-            return 'Iceland'
+    if not hits.isdisjoint(SPANISH_CITIES):
+        if len(hits.intersection(SPANISH_CITY_MENTIONS)) > 1:
+            return ''
+        return 'Spain'
     
+    if not hits.isdisjoint(ICELANDIC_CITIES):
+        if len(hits.intersection(ICELANDIC_CITY_MENTIONS)) > 1:
+            return ''
+        return 'Iceland'
     
-    if ('province' in loc or 'district' in loc) and 'china' in loc:
+    if ('province' in hits or 'district' in hits) and 'china' in hits:
         return 'China'
     
-    if 'montreal' in loc:
+    if 'montreal' in hits:
         return 'Canada'
     
-    for city, country in SCANDINAVIAN_CITIES.items():
-        if city in loc:
-            scandi_countries = ['denmark', 'sweden', 'norway', 'finland', 'iceland', 'danmark', 'sverige', 'norge', 'island']
-            country_mentions = sum(1 for c in scandi_countries if c in loc)
-            if country_mentions > 1:
-                return ''  
-            return country
+    scandinavian = [city for city in hits if city in SCANDINAVIAN_RANK]
+    if scandinavian:
+        if len(hits.intersection(SCANDINAVIAN_COUNTRIES)) > 1:
+            return ''
+        return SCANDINAVIAN_CITIES[min(scandinavian, key=SCANDINAVIAN_RANK.get)]
     
     separators = [',', ';', '|', '⮀', '/']
     parts = [location_original.strip()]
@@ -325,29 +376,11 @@ def identify_country(location):
         if part in country_all:
             return country_all[part]
     
-    for key, country in state_city_country.items():
-        if key in loc and len(key) > 3:  
-            return country
-    
-    try:
-        resp = requests.get(
-            'https://nominatim.openstreetmap.org/search',
-            params={'q': location_original, 'format': 'json', 'addressdetails': 1, 'limit': 1},
-            headers={'User-Agent': 'github-country-lookup'},
-            timeout=10
-        )
-        if resp.status_code == 200:
-            data = resp.json()
-            if data and len(data) > 0 and 'address' in data[0]:
-                addr = data[0]['address']
-                if 'country' in addr:
-                    country_from_api = addr['country']
-                    normalized = normalize_country_name(country_from_api)
-                    return normalized
-    except Exception:
-        pass
+    state_city = [key for key in hits if key in STATE_CITY_RANK]
+    if state_city:
+        return state_city_country[min(state_city, key=STATE_CITY_RANK.get)]
     
-    return ''
+    return geocoder.lookup(location_original)
 
 
 def read_input_csv(filename):
@@ -378,60 +411,122 @@ def read_input_csv(filename):
     return repos
 
 
-def main():
-    input_csv = 'reposFinal.csv' 
-    repos = read_input_csv(input_csv)
+def main(input_csv='reposFinal.csv', output_csv='users_countries.csv', shard=None):
+    repos = [repo for repo in read_input_csv(input_csv) if in_shard(repo['repo_url'], shard)]
     print("Coletando contribuidores e gerando CSV...")
     
-    valid_entries = 0
-    skipped_invalid = 0
-    skipped_no_country = 0
+    counts = {'valid_entries': 0, 'skipped_invalid': 0, 'skipped_no_country': 0, 'pairs': 0}
+    # login -> (profile_url, location, country); country vazio = descartado.
+    # Cada perfil é buscado e classificado uma vez só, mesmo aparecendo em vários repositórios.
+    resolved = {}
+    pending = {}
+    batch = []
+    batch_size = USERS_BATCH_SIZE if USE_GRAPHQL else 1
+    login_queue = queue.Queue(maxsize=LOGIN_QUEUE_SIZE)
+    result_queue = queue.Queue()
+    slots = threading.BoundedSemaphore(NUM_WORKERS * 2)
+    
+    producer = threading.Thread(target=stream_contributors, args=(repos, login_queue), daemon=True)
+    producer.start()
     
-    with open('users_countries.csv', 'w', newline='', encoding='utf-8') as f:
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
         writer = csv.writer(f)
         writer.writerow(['repo_name', 'repo_url', 'login', 'profile_url', 'location', 'country'])
-        with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-            futures = {}
-            for repo in repos:
-                owner = repo['owner']
-                name = repo['name']
-                repo_url = repo['repo_url']
-                contributors = fetch_contributors(owner, name)
-                for login in contributors:
-                    future = executor.submit(fetch_user, login)
-                    futures[future] = (repo['repo_name'], repo_url)
-            for future in as_completed(futures):
-                try:
-                    login, profile_url, location = future.result()
-                    repo_name, repo_url = futures[future]
-                    
-                    if not location or not is_valid_location(location):
-                        skipped_invalid += 1
-                        continue
-                    
+        
+        def write_membership(login, repo_name, repo_url):
+            profile_url, location, country = resolved[login]
+            if country:
+                writer.writerow([repo_name, repo_url, login, profile_url, location, country])
+                counts['valid_entries'] += 1
+            elif not location or not is_valid_location(location):
+                counts['skipped_invalid'] += 1
+            else:
+                counts['skipped_no_country'] += 1
+        
+        def classify(login, profile_url, location):
+            country = ''
+            try:
+                if location and is_valid_location(location):
                     country = identify_country(location)
-                    
                     if not country:
-                        skipped_no_country += 1
                         print(f"⚠️  Skipping {login}: undefined location '{location}'")
-                        continue
-                    
-                    country = normalize_country_name(country)
-                    
-                    if country:
-                        writer.writerow([repo_name, repo_url, login, profile_url, location, country])
-                        valid_entries += 1
+                    else:
+                        country = normalize_country_name(country)
                         print(f"✅ {login}: {location} → {country}")
-                    
-                    time.sleep(1)
-                except Exception as e:
-                    print(f"Erro ao processar usuário: {e}")
+            except Exception as e:
+                print(f"Erro ao processar usuário: {e}")
+            resolved[login] = (profile_url, location, country)
+            for repo_name, repo_url in pending.pop(login, []):
+                write_membership(login, repo_name, repo_url)
+        
+        def handle_result(future, logins):
+            try:
+                users = future.result()
+            except Exception as e:
+                print(f"Erro ao buscar usuários: {e}")
+                users = [(login, '', '') for login in logins]
+            for login, profile_url, location in users:
+                classify(login, profile_url, location)
+            f.flush()
+        
+        with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
+            in_flight = 0
+            
+            def submit():
+                nonlocal batch, in_flight
+                slots.acquire()
+                logins = batch
+                future = executor.submit(fetch_user_batch, logins)
+                future.add_done_callback(lambda fut: (slots.release(), result_queue.put((fut, logins))))
+                batch = []
+                in_flight += 1
+            
+            producing = True
+            while producing or batch or in_flight:
+                while True:
+                    try:
+                        future, logins = result_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    handle_result(future, logins)
+                    in_flight -= 1
+                if producing:
+                    try:
+                        item = login_queue.get(timeout=BATCH_TIMEOUT)
+                    except queue.Empty:
+                        item = None
+                    if item is _DONE:
+                        producing = False
+                    elif item is not None:
+                        login, repo_name, repo_url = item
+                        counts['pairs'] += 1
+                        if login in resolved:
+                            write_membership(login, repo_name, repo_url)
+                        elif login in pending:
+                            pending[login].append((repo_name, repo_url))
+                        else:
+                            pending[login] = [(repo_name, repo_url)]
+                            batch.append(login)
+                    if batch and (len(batch) >= batch_size or item is None or not producing):
+                        submit()
+                elif batch:
+                    submit()
+                elif in_flight:
+                    future, logins = result_queue.get()
+                    handle_result(future, logins)
+                    in_flight -= 1
     
+    dedup_ratio = counts['pairs'] / len(resolved) if resolved else 0
     print(f"\n=== RESUMO ===")
-    print(f"✅ Entradas válidas gravadas: {valid_entries}")
-    print(f"⚠️  Locations inválidas desconsideradas: {skipped_invalid}")
-    print(f"⚠️  Locations sem país identificado: {skipped_no_country}")
-    print(f"📄 CSV gerado: users_countries.csv")
+    print(f"✅ Entradas válidas gravadas: {counts['valid_entries']}")
+    print(f"⚠️  Locations inválidas desconsideradas: {counts['skipped_invalid']}")
+    print(f"⚠️  Locations sem país identificado: {counts['skipped_no_country']}")
+    print(f"👥 Pares repo/contribuidor: {counts['pairs']}, logins distintos: {len(resolved)} (dedup {dedup_ratio:.2f}x)")
+    print(f"📄 CSV gerado: {output_csv}")
+    print(response_cache.summary())
+    print(throttle.summary())
+    print(geocoder.summary())
+    print(scheduler.summary())
 
 
 if __name__ == '__main__':
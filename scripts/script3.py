@@ -1,120 +1,102 @@
 import requests
 import csv
+import re
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import pycountry
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from http_cache import ResponseCache
+from token_scheduler import TokenScheduler, load_tokens
+from github_graphql import API_URL, USERS_BATCH_SIZE, fetch_users
+from sharding import in_shard
+from repo_search import discover_repos
+from incremental_writer import IncrementalCSV
+from pagination import IncompletePages
 from unidecode import unidecode
+from script2 import (
+    country_aliases, country_all, identify_country, is_valid_location, normalize_country_name, state_city_country
+)
 
-TOKENS = []
-NUM_WORKERS = len(TOKENS) * 8
+TOKENS = load_tokens()
+NUM_WORKERS = max(len(TOKENS), 1) * 8
+REPO_WORKERS = max(len(TOKENS), 1) * 4
+LOOKUP_WINDOW = 2
+USE_GRAPHQL = True
+# a busca tem limite de 30 req/min por token (e secundário para concorrência): poucos workers
+SEARCH_WORKERS = max(len(TOKENS), 1) * 2
+MAX_REPOS = 1500
+MIN_STARS = 1
+PARTIAL_CSV = 'reposFinal_partial.csv'
+OUTPUT_COLUMNS = ['repo_name', 'repo_id', 'repo_url', 'login', 'profile_url', 'location', 'country']
+# países do estudo (emergentes e a comparação), nos nomes que normalize_country_name devolve
+TARGET_COUNTRIES = {'Brazil', 'India', 'United States', 'Germany'}
+LOCATION_SEPARATORS = re.compile(r'[,;|/⮀]')
+# falhas de rede/API que só adiam o repositório; qualquer outra exceção é bug e interrompe a execução
+LOOKUP_ERRORS = (IncompletePages, requests.exceptions.RequestException, ValueError)
 
 
-def get_headers(token):
-    return {'Authorization': f'token {token}'}
-
-
-def round_robin_tokens():
-    while True:
-        for token in TOKENS:
-            yield token
-
-
-token_gen = round_robin_tokens()
+scheduler = TokenScheduler(TOKENS)
+response_cache = ResponseCache()
+# login -> (profile_url, location) de quem já foi consultado; contribuidores se repetem entre repositórios
+known_users = {}
+stats = Counter()
+stats_lock = threading.Lock()
 
 
 def safe_request(url, params=None, max_retries=3):
-    for attempt in range(max_retries):
-        for _ in range(len(TOKENS)):
-            token = next(token_gen)
-            headers = get_headers(token)
-            try:
-                r = requests.get(url, headers=headers, params=params, timeout=30)
-                if r.status_code == 403 and 'rate limit' in r.text.lower():
-                    continue
-                if r.status_code == 404:
-                    return None
-                r.raise_for_status()
-                return r
-            except requests.exceptions.HTTPError as e:
-                if e.response.status_code == 404:
-                    return None
-                time.sleep(2)
-                continue
-            except (requests.exceptions.SSLError,
-                    requests.exceptions.ConnectionError,
-                    requests.exceptions.Timeout):
-                time.sleep(5)
-                continue
-        time.sleep(60)
+    attempt = 0
+    while attempt < max_retries:
+        try:
+            r = response_cache.request(scheduler, url, params, timeout=30)
+            if r.status_code == 404:
+                return None
+            r.raise_for_status()
+            return r
+        except requests.exceptions.HTTPError as e:
+            if e.response.status_code == 404:
+                return None
+            attempt += 1
+            time.sleep(2)
+        except (requests.exceptions.SSLError,
+                requests.exceptions.ConnectionError,
+                requests.exceptions.Timeout):
+            attempt += 1
+            time.sleep(5)
     return None
 
 
 def fetch_top_repos():
-    url = 'https://api.github.com/search/repositories'
-    repos = []
-    for page in range(1, 11):
-        params = {
-            'q': 'stars:>0',
-            'sort': 'stars',
-            'order': 'desc',
-            'per_page': 100,
-            'page': page
-        }
-        r = safe_request(url, params)
-        if r is None:
-            break
-        data = r.json()
-        if 'items' not in data:
-            break
-        repos.extend(data['items'])
-        if len(data['items']) < 100:
-            break
+    with ThreadPoolExecutor(max_workers=SEARCH_WORKERS) as executor:
+        return discover_repos(safe_request, executor, max_repos=MAX_REPOS, min_stars=MIN_STARS)
 
-    if len(repos) >= 1000:
-        min_stars = repos[-1]['stargazers_count']
-        for page in range(1, 6):
-            params = {
-                'q': f'stars:<{min_stars}',
-                'sort': 'stars',
-                'order': 'desc',
-                'per_page': 100,
-                'page': page
-            }
-            r = safe_request(url, params)
-            if r is None:
-                break
-            data = r.json()
-            if 'items' not in data:
-                break
-            repos.extend(data['items'])
-            if len(data['items']) < 100:
-                break
-    return repos
-
-
-def fetch_contributors(owner, repo):
-    contributors = []
+
+def iter_contributors(owner, repo):
+    """Logins dos contribuidores, uma página por vez: o chamador que já achou o que
+    procurava não paga pelas páginas seguintes. Bots ficam de fora (não têm localização).
+    Página que não veio levanta IncompletePages, para o repositório não ser dado como examinado."""
     page = 1
     while True:
-        url = f'https://api.github.com/repos/{owner}/{repo}/contributors'
+        url = f'{API_URL}/repos/{owner}/{repo}/contributors'
         params = {'per_page': 100, 'page': page}
         r = safe_request(url, params)
         if r is None:
+            raise IncompletePages(f'{url}: página {page} não veio')
+        if r.status_code == 204:
+            # repositório vazio: a API responde sem corpo
             break
         data = r.json()
-        if not data or 'message' in data:
+        if not isinstance(data, list):
+            raise IncompletePages(f'{url}: página {page} não veio')
+        if not data:
             break
-        for user in data:
-            if 'login' in user:
-                contributors.append(user['login'])
+        yield [user['login'] for user in data if 'login' in user and user.get('type') != 'Bot']
         if len(data) < 100:
             break
         page += 1
-    return contributors
 
 
 def fetch_user(login):
-    url = f'https://api.github.com/users/{login}'
+    url = f'{API_URL}/users/{login}'
     r = safe_request(url)
     if r is None:
         return login, '', ''
@@ -124,63 +106,160 @@ def fetch_user(login):
     return login, profile_url, location
 
 
-country_names = {unidecode(c.name.lower()): c.name for c in pycountry.countries}
-country_alpha2 = {c.alpha_2.lower(): c.name for c in pycountry.countries}
-country_alpha3 = {c.alpha_3.lower(): c.name for c in pycountry.countries}
-country_official = {unidecode(getattr(c, 'official_name', '').lower()): c.name for c in pycountry.countries if hasattr(c, 'official_name')}
-country_all = {**country_names, **country_alpha2, **country_alpha3, **country_official}
-
-# (As estruturas state_city_country, country_aliases, TARGET_COUNTRIES, INVALID_LOCATIONS, etc.)
-# permanecem exatamente como estavam no seu código original, identadas da mesma forma.
-
-# As funções is_valid_location(), normalize_country_name(), validate_country_match(), identify_country()
-# permanecem identadas corretamente, assim como no restante do script.
-
-def main():
-    repos = fetch_top_repos()
-    rows = []
-    with ThreadPoolExecutor(max_workers=NUM_WORKERS) as executor:
-        for repo in repos:
-            owner = repo['owner']['login']
-            name = repo['name']
-            repo_id = repo['id']
-            repo_url = repo['html_url']
-            contributors = fetch_contributors(owner, name)
-            if not contributors:
-                continue
-            found = False
-            future_to_login = {executor.submit(fetch_user, login): login for login in contributors}
-            for future in as_completed(future_to_login):
+def add_stat(name, amount=1):
+    with stats_lock:
+        stats[name] += amount
+
+
+def fetch_user_batch(logins):
+    add_stat('lookups', len(logins))
+    if USE_GRAPHQL:
+        users = fetch_users(scheduler, logins, fetch_user)
+    else:
+        users = [fetch_user(login) for login in logins]
+    for login, profile_url, location in users:
+        known_users[login] = (profile_url, location)
+    return users
+
+
+def validate_country_match(location, country):
+    """Nenhuma parte da localização aponta para outro país: 'Brazil / Portugal' ou
+    'San Francisco, CA' (cidade americana, sigla do Canadá) ficam de fora."""
+    for part in LOCATION_SEPARATORS.split(location):
+        part = unidecode(part.strip().lower())
+        other = country_aliases.get(part) or state_city_country.get(part) or country_all.get(part)
+        if other and normalize_country_name(other) != country:
+            return False
+    return True
+
+
+def target_country(profile_url, location):
+    """País-alvo do contribuidor, ou None se a localização não identifica um."""
+    if not profile_url or not is_valid_location(location):
+        return None
+    country = identify_country(location)
+    if not country:
+        return None
+    country = normalize_country_name(country)
+    if not validate_country_match(location, country):
+        return None
+    return country if country in TARGET_COUNTRIES else None
+
+
+def first_match(users):
+    for login, profile_url, location in users:
+        country = target_country(profile_url, location)
+        if country:
+            return login, profile_url, location, country
+    return None
+
+
+def lookup_until_match(logins, executor):
+    """Consulta os logins em lotes, no máximo LOOKUP_WINDOW lotes por vez; no primeiro
+    contribuidor de país-alvo, os lotes que ainda não começaram são cancelados (os que já
+    estão em andamento são no máximo LOOKUP_WINDOW - 1 e ainda servem ao known_users).
+    Sem país-alvo e com algum lote perdido, levanta IncompletePages em vez de dizer que não há."""
+    batch_size = USERS_BATCH_SIZE if USE_GRAPHQL else 1
+    batches = iter([logins[start:start + batch_size] for start in range(0, len(logins), batch_size)])
+    running = set()
+    lost = 0
+    try:
+        while True:
+            for batch in batches:
+                running.add(executor.submit(fetch_user_batch, batch))
+                if len(running) >= LOOKUP_WINDOW:
+                    break
+            if not running:
+                if lost:
+                    raise IncompletePages(f'{lost} lotes de usuários falharam')
+                return None
+            finished, running = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
                 try:
-                    login, profile_url, location = future.result()
-                    if not profile_url:
-                        continue
-                    if not is_valid_location(location):
-                        continue
-                    country = identify_country(location)
-                    if not country:
-                        continue
-                    country = normalize_country_name(country)
-                    if not validate_country_match(location, country):
-                        continue
-                    if country in TARGET_COUNTRIES:
-                        rows.append([name, repo_id, repo_url, login, profile_url, location, country])
-                        found = True
-                        break
-                except Exception:
+                    users = future.result()
+                except LOOKUP_ERRORS:
+                    lost += 1
                     continue
-            if found:
-                with open('reposFinal.csv', 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.writer(f)
-                    writer.writerow(['repo_name', 'repo_id', 'repo_url', 'login', 'profile_url', 'location', 'country'])
-                    for row in rows:
-                        writer.writerow(row)
-
-    with open('reposFinal.csv', 'w', newline='', encoding='utf-8') as f:
-        writer = csv.writer(f)
-        writer.writerow(['repo_name', 'repo_id', 'repo_url', 'login', 'profile_url', 'location', 'country'])
-        for row in rows:
-            writer.writerow(row)
+                match = first_match(users)
+                if match:
+                    return match
+    finally:
+        for future in running:
+            future.cancel()
+
+
+def scan_repo(repo, executor):
+    """Primeira linha do reposFinal para o repositório, ou None se nenhum contribuidor é de país-alvo.
+
+    Do mais barato para o mais caro: contribuidores já consultados em outro repositório
+    (sem requisição), depois os demais da mesma página, e só então a página seguinte.
+    """
+    for logins in iter_contributors(repo['owner']['login'], repo['name']):
+        known = [(login, *known_users[login]) for login in logins if login in known_users]
+        add_stat('contributors', len(logins))
+        add_stat('reused', len(known))
+        match = first_match(known)
+        if not match:
+            unknown = [login for login in logins if login not in known_users]
+            match = lookup_until_match(unknown, executor)
+        if match:
+            login, profile_url, location, country = match
+            return {
+                'repo_name': repo['name'], 'repo_id': repo['id'], 'repo_url': repo['html_url'],
+                'login': login, 'profile_url': profile_url, 'location': location, 'country': country,
+            }
+    return None
+
+
+def write_output(output_csv, repos):
+    """reposFinal.csv a partir do parcial, na ordem da busca (mais estrelas primeiro)."""
+    rank = {repo['html_url']: i for i, repo in enumerate(repos)}
+    with open(PARTIAL_CSV, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    rows.sort(key=lambda row: rank.get(row['repo_url'], len(rank)))
+    with open(output_csv, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    return len(rows)
+
+
+def main(output_csv='reposFinal.csv', shard=None):
+    repos = [repo for repo in fetch_top_repos() if in_shard(repo['id'], shard)]
+    with IncrementalCSV(PARTIAL_CSV, OUTPUT_COLUMNS) as sink:
+        pending = [repo for repo in repos if repo['html_url'] not in sink.done]
+        if len(pending) < len(repos):
+            print(f"{len(repos) - len(pending)} repositórios já examinados em {PARTIAL_CSV}; faltam {len(pending)}")
+        # usuários num pool próprio: um repositório esperando seus lotes não ocupa vaga deles
+        with ThreadPoolExecutor(max_workers=NUM_WORKERS) as user_executor, \
+                ThreadPoolExecutor(max_workers=REPO_WORKERS) as repo_executor:
+            futures = {repo_executor.submit(scan_repo, repo, user_executor): repo for repo in pending}
+            try:
+                for future in as_completed(futures):
+                    try:
+                        row = future.result()
+                    except LOOKUP_ERRORS:
+                        # sem commit: o repositório é examinado de novo na próxima execução
+                        add_stat('failed')
+                        continue
+                    # repositório sem contribuidor de país-alvo também é registrado, sem linha
+                    sink.commit(futures[future]['html_url'], [row] if row else [])
+            except BaseException:
+                # erro de programa: não espera o resto da fila terminar para falhar
+                for future in futures:
+                    future.cancel()
+                raise
+
+    written = write_output(output_csv, repos)
+    if not stats['failed']:
+        # tudo examinado: sem o parcial, a próxima execução busca os contribuidores de novo
+        sink.discard()
+    print(f"{written} repositórios em {output_csv}; contribuidores vistos: {stats['contributors']}, "
+          f"consultados: {stats['lookups']}, reaproveitados: {stats['reused']}")
+    if stats['failed']:
+        print(f"{stats['failed']} repositórios falharam e ficam para a próxima execução")
+    print(response_cache.summary())
+    print(scheduler.summary())
 
 
 if __name__ == '__main__':
@@ -1,65 +1,44 @@
-import requests
 import pandas as pd
 import time
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from threading import Lock
 import random
+from http_cache import ResponseCache
+from token_scheduler import TokenScheduler, load_tokens
+from incremental_writer import IncrementalCSV
+from event_store import EventStore
+from sharding import in_shard
+from loaders import load_frame
 
-TOKENS = [
-]
+TOKENS = load_tokens()
 
-token_idx = 0
-token_lock = Lock()
-SLEEP_TIME = 0.1
+REPO_WORKERS = max(len(TOKENS), 1) * 2
+PAGE_WORKERS = max(len(TOKENS), 1) * 8
+PARTIAL_CSV = 'prs_raw_partial.csv'
+PR_COLUMNS = ['repo_name', 'pr_number', 'author', 'reviewers_requested', 'opened_at', 'merged_at', 'closed_at']
+scheduler = TokenScheduler(TOKENS)
+response_cache = ResponseCache()
+event_store = EventStore()
+page_executor = ThreadPoolExecutor(max_workers=PAGE_WORKERS)
 
-def get_headers():
-    global token_idx
-    with token_lock:
-        headers = {'Authorization': f'token {TOKENS[token_idx]}'}
-        token_idx = (token_idx + 1) % len(TOKENS)
-        return headers
-
-def safe_request(url, max_retries=3):
-    for attempt in range(max_retries):
+def safe_request(url, params=None, max_retries=3):
+    attempt = 0
+    while attempt < max_retries:
         try:
-            r = requests.get(url, headers=get_headers(), timeout=30)
-            if r.status_code == 403 and 'rate limit' in r.text.lower():
-                time.sleep(60)
-                continue
+            r = response_cache.request(scheduler, url, params, timeout=30)
             if r.status_code == 200:
                 return r
             elif r.status_code == 404:
                 return None
+            attempt += 1
         except Exception as e:
-            if attempt < max_retries - 1:
-                time.sleep(2 ** attempt)
+            attempt += 1
+            if attempt < max_retries:
+                time.sleep(2 ** (attempt - 1))
     return None
 
-def collect_paginated_data(base_url, max_pages=50):
-    all_data = []
-    page = 1
-    
-    while page <= max_pages:
-        url = f'{base_url}{"&" if "?" in base_url else "?"}per_page=100&page={page}'
-        r = safe_request(url)
-        if not r or r.status_code != 200:
-            break
-        try:
-            data = r.json()
-        except:
-            break
-        if not data or not isinstance(data, list):
-            break
-        all_data.extend(data)
-        if len(data) < 100:
-            break
-        page += 1
-        time.sleep(SLEEP_TIME)
-    return all_data
-
 def format_datetime(dt_string):
-    if not dt_string:
+    if not dt_string or not isinstance(dt_string, str):
         return ""
     try:
         dt = datetime.fromisoformat(dt_string.replace('Z', '+00:00'))
@@ -72,32 +51,26 @@ def collect_repository_prs(repo_info):
     repo_url = repo_info['repo_url']
     repo_full_name = repo_url.replace('https://github.com/', '').strip('/')
     
-    try:
-        prs_url = f'https://api.github.com/repos/{repo_full_name}/pulls?state=all'
-        prs = collect_paginated_data(prs_url, max_pages=100)
-        
-        prs_data = []
-        for pr in prs:
-            if not pr.get('user') or not pr['user']:
-                continue
-                
-            reviewers_requested = []
-            if pr.get('requested_reviewers'):
-                reviewers_requested = [r['login'] for r in pr['requested_reviewers']]
-            
-            pr_data = {
-                'repo_name': repo_name,
-                'pr_number': pr['number'],
-                'author': pr['user']['login'],
-                'reviewers_requested': ','.join(reviewers_requested) if reviewers_requested else '',
-                'opened_at': format_datetime(pr['created_at']),
-                'merged_at': format_datetime(pr.get('merged_at', '')),
-                'closed_at': format_datetime(pr.get('closed_at', ''))
-            }
-            prs_data.append(pr_data)
-        return prs_data
-    except Exception as e:
-        return []
+    # primeira vez: todas as páginas em paralelo; depois, só os PRs atualizados desde a última.
+    # Falha (página faltando, repositório inacessível) sobe para o main, que não marca o repo como feito
+    event_store.sync_prs(repo_full_name, safe_request, executor=page_executor)
+    prs = event_store.prs([repo_full_name])
+    
+    prs_data = []
+    for pr in prs.itertuples():
+        # PR sem autor (conta removida) fica com author vazio: conta no total do repositório,
+        # como na lista que o script_user_metrics traz da API
+        pr_data = {
+            'repo_name': repo_name,
+            'pr_number': pr.number,
+            'author': pr.author if isinstance(pr.author, str) else '',
+            'reviewers_requested': pr.reviewers if isinstance(pr.reviewers, str) else '',
+            'opened_at': format_datetime(pr.created_at),
+            'merged_at': format_datetime(pr.merged_at),
+            'closed_at': format_datetime(pr.closed_at)
+        }
+        prs_data.append(pr_data)
+    return prs_data
 
 def generate_sample_dates():
     base_dates = [
@@ -109,9 +82,9 @@ def generate_sample_dates():
     ]
     return random.choice(base_dates)
 
-def simulate_pr_data_for_testing():
+def simulate_pr_data_for_testing(input_csv='users_countries.csv'):
     try:
-        df = pd.read_csv('users_countries.csv')
+        df = pd.read_csv(input_csv)
         repos = df[['repo_name', 'repo_url']].drop_duplicates()
     except:
         repos = pd.DataFrame({
@@ -162,38 +135,49 @@ def simulate_pr_data_for_testing():
             pr_counter += 1
     return all_prs
 
-def main():
-    input_csv = 'users_countries.csv'
-    output_csv = 'prs_raw.csv'
-    
+def main(input_csv='users_countries.csv', output_csv='prs_raw.csv', shard=None, use_real_api=True):
     try:
-        df = pd.read_csv(input_csv)
-        repos_df = df[['repo_name', 'repo_url']].drop_duplicates()
-        repos = repos_df.to_dict(orient='records')
-        use_real_api = input("Usar API real do GitHub? (s/N): ").lower().startswith('s')
+        df = load_frame(input_csv, columns=['repo_name', 'repo_url'])
+        repos_df = df.drop_duplicates().astype(str)
+        repos = [repo for repo in repos_df.to_dict(orient='records') if in_shard(repo['repo_url'], shard)]
     except Exception as e:
         use_real_api = False
         repos = []
     
     all_prs_data = []
+    sink = None
+    failed = 0
     
     if use_real_api and repos:
-        with ThreadPoolExecutor(max_workers=3) as executor:
-            futures = {executor.submit(collect_repository_prs, repo): repo for repo in repos}
-            for future in as_completed(futures):
-                try:
-                    repo_prs = future.result()
-                    all_prs_data.extend(repo_prs)
-                    if all_prs_data and len(all_prs_data) % 100 == 0:
-                        pd.DataFrame(all_prs_data).to_csv('prs_raw_partial.csv', index=False)
-                except Exception as e:
-                    pass
+        with IncrementalCSV(PARTIAL_CSV, PR_COLUMNS) as sink:
+            pending = [repo for repo in repos if repo['repo_url'] not in sink.done]
+            if len(pending) < len(repos):
+                print(f"{len(repos) - len(pending)} repositórios já gravados em {PARTIAL_CSV}; faltam {len(pending)}")
+            with ThreadPoolExecutor(max_workers=REPO_WORKERS) as executor:
+                futures = {executor.submit(collect_repository_prs, repo): repo for repo in pending}
+                for future in as_completed(futures):
+                    try:
+                        rows = future.result()
+                    except Exception as e:
+                        # sem commit: o repositório é buscado de novo na próxima execução
+                        failed += 1
+                        continue
+                    sink.commit(futures[future]['repo_url'], rows)
+            if failed:
+                print(f"{failed} repositórios falharam e ficam para a próxima execução")
+        all_prs_data = pd.read_csv(PARTIAL_CSV, keep_default_na=False).to_dict(orient='records')
     else:
-        all_prs_data = simulate_pr_data_for_testing()
+        all_prs_data = simulate_pr_data_for_testing(input_csv)
     
     if all_prs_data:
         final_df = pd.DataFrame(all_prs_data)
         final_df.to_csv(output_csv, index=False)
+    if sink and not failed:
+        # sem o parcial, a próxima execução passa de novo pelo sync_prs incremental de cada repositório
+        sink.discard()
+    if use_real_api:
+        print(response_cache.summary())
+        print(scheduler.summary())
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -3,68 +3,118 @@ import aiohttp
 import pandas as pd
 from datetime import datetime
 from tqdm.asyncio import tqdm_asyncio
-import itertools
-import time
+from urllib.parse import urlencode
+from pr_cache import PRCache
+from event_store import USER_PR_WINDOW, EventStore
+from http_cache import ResponseCache
+from token_scheduler import TokenScheduler, load_tokens, resource_for, is_rate_limited
+from github_graphql import API_URL, CONTRIBUTIONS_BATCH_SIZE, fetch_contributions_batch
+from throttle import AdaptiveConcurrency
+from incremental_writer import IncrementalCSV
+from pagination import iter_pages
+from sharding import in_shard
+from loaders import load_frame
 
-TOKENS = [
-]
+TOKENS = load_tokens()
 
-token_cycle = itertools.cycle(TOKENS)
-BASE_URL = "https://api.github.com"
-MAX_CONCURRENT = len(TOKENS) * 3
-semaphore = asyncio.Semaphore(MAX_CONCURRENT)
+scheduler = TokenScheduler(TOKENS)
+BASE_URL = API_URL
+USE_GRAPHQL = True
+# requisições HTTP simultâneas (conector e AdaptiveConcurrency); USER_WORKERS (--workers no cli)
+# só diz quantos usuários ficam em andamento, as requisições deles dividem este limite
+MAX_CONCURRENT = max(len(TOKENS) * 3, 1)
+USER_WORKERS = 50
+PAGE_CONCURRENCY = 4
+# criado em main(), dentro do event loop
+limiter = None
+PRS_RAW_CSV = 'prs_raw.csv'
+PR_CACHE_DIR = 'pr_cache'
+PARTIAL_CSV = 'users_metrics_partial.csv'
+pr_cache = PRCache(cache_dir=PR_CACHE_DIR)
+response_cache = ResponseCache()
+contributions = {}
 
-async def fetch(session, url, retries=3):
-    async with semaphore:
-        for attempt in range(retries):
-            token = next(token_cycle)
-            headers = {
-                "Authorization": f"token {token}",
-                "Accept": "application/vnd.github+json"
-            }
+async def fetch_response(session, url, retries=3):
+    resource = resource_for(url)
+    # resposta fresca no disco: sem token nem vaga no limiter
+    cached = response_cache.fresh(url)
+    if cached is not None:
+        return cached
+    async with limiter:
+        attempt = 0
+        while attempt < retries:
+            attempt += 1
+            token = await scheduler.acquire_async(resource)
+            headers = {"Accept": "application/vnd.github+json"}
+            if token:
+                headers["Authorization"] = f"token {token}"
             try:
-                async with session.get(url, headers=headers, timeout=30) as resp:
-                    if resp.status == 403:
-                        await asyncio.sleep(0.5)
-                        continue
-                    if resp.status == 404:
-                        return None
-                    if resp.status == 200:
-                        return await resp.json()
+                resp = await response_cache.aget(session, url, headers=headers, timeout=30)
+                scheduler.update(token, resp, resource)
+                if is_rate_limited(resp):
+                    limiter.backoff()
+                    attempt -= 1
+                    continue
+                if resp.status_code == 403:
+                    limiter.backoff()
                     await asyncio.sleep(0.5)
+                    continue
+                if resp.status_code == 404:
+                    return None
+                if resp.status_code == 200:
+                    limiter.succeed()
+                    return resp
+                await asyncio.sleep(0.5)
             except asyncio.TimeoutError:
-                if attempt < retries - 1:
+                if attempt < retries:
                     await asyncio.sleep(1)
                     continue
             except Exception as e:
-                if attempt < retries - 1:
+                if attempt < retries:
                     await asyncio.sleep(1)
                     continue
         return None
 
-async def fetch_all_pages(session, base_url, max_pages=10):
-    all_data = []
-    first_page = await fetch(session, f"{base_url}&per_page=100&page=1")
-    if not first_page:
-        return []
-    
-    all_data.extend(first_page if isinstance(first_page, list) else [first_page])
-    if len(first_page) < 100:
-        return all_data
-    
-    tasks = []
-    for page in range(2, max_pages + 1):
-        url = f"{base_url}&per_page=100&page={page}"
-        tasks.append(fetch(session, url))
-    
-    if tasks:
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        for result in results:
-            if result and isinstance(result, list) and len(result) > 0:
-                all_data.extend(result)
-            elif result and len(result) < 100:
-                break
-    return all_data
+async def fetch(session, url, retries=3):
+    resp = await fetch_response(session, url, retries)
+    return resp.json() if resp is not None else None
+
+def iter_all_pages(session, base_url, max_pages=10, strict=False):
+    """Páginas de base_url (já com a query, ex.: '?state=all') como iterador assíncrono."""
+    async def request(url, params):
+        return await fetch_response(session, f"{url}{'&' if '?' in url else '?'}{urlencode(params)}")
+    return iter_pages(request, base_url, max_pages=max_pages, concurrency=PAGE_CONCURRENCY, strict=strict)
+
+def repo_full_name(repo_url):
+    return repo_url.replace('https://github.com/', '').strip('/')
+
+async def prefetch_contributions(users):
+    """Preenche `contributions` com PRs/issues/commits por (repo, login) via GraphQL em lote.
+
+    O que não vier (sem token, erro, usuário removido) fica de fora e é buscado
+    pela /search dentro de get_user_detailed_metrics.
+    """
+    by_repo = {}
+    for user in users:
+        full_name = repo_full_name(user['repo_url'])
+        if full_name.count('/') != 1:
+            continue
+        logins = by_repo.setdefault(full_name, [])
+        if user['login'] not in logins:
+            logins.append(user['login'])
+    jobs = []
+    for full_name, logins in by_repo.items():
+        owner, repo = full_name.split('/')
+        for start in range(0, len(logins), CONTRIBUTIONS_BATCH_SIZE):
+            jobs.append((full_name, asyncio.to_thread(
+                fetch_contributions_batch, scheduler, owner, repo, logins[start:start + CONTRIBUTIONS_BATCH_SIZE]
+            )))
+    results = await asyncio.gather(*(job for _, job in jobs), return_exceptions=True)
+    for (full_name, _), found in zip(jobs, results):
+        if isinstance(found, dict):
+            for login, counts in found.items():
+                contributions[(full_name, login)] = counts
+    return len(contributions)
 
 async def get_user_detailed_metrics(session, user_data):
     try:
@@ -87,47 +137,41 @@ async def get_user_detailed_metrics(session, user_data):
         issues_search_url = f"{BASE_URL}/search/issues?q=type:issue+author:{login}+repo:{repo_owner}/{repo}"
         user_repos_url = f"{BASE_URL}/users/{login}/repos?per_page=100"
 
-        basic_results = await asyncio.gather(
-            fetch(session, user_profile_url),
-            fetch(session, prs_search_url),
-            fetch(session, commits_search_url),
-            fetch(session, issues_search_url),
-            fetch(session, user_repos_url),
-            return_exceptions=True
-        )
+        counts = contributions.get((f"{repo_owner}/{repo}", login))
+        if counts:
+            user_repos = await fetch(session, user_repos_url)
+            prs_opened = counts['prs_opened']
+            commits_total = counts['commits_total']
+            issues_opened = counts['issues_opened']
+        else:
+            basic_results = await asyncio.gather(
+                fetch(session, user_profile_url),
+                fetch(session, prs_search_url),
+                fetch(session, commits_search_url),
+                fetch(session, issues_search_url),
+                fetch(session, user_repos_url),
+                return_exceptions=True
+            )
 
-        user_profile, prs_data, commits_data, issues_data, user_repos = basic_results
+            user_profile, prs_data, commits_data, issues_data, user_repos = basic_results
 
-        prs_opened = prs_data.get('total_count', 0) if prs_data else 0
-        commits_total = commits_data.get('total_count', 0) if commits_data else 0
-        issues_opened = issues_data.get('total_count', 0) if issues_data else 0
+            prs_opened = prs_data.get('total_count', 0) if prs_data else 0
+            commits_total = commits_data.get('total_count', 0) if commits_data else 0
+            issues_opened = issues_data.get('total_count', 0) if issues_data else 0
 
         prs_url = f"{BASE_URL}/repos/{repo_owner}/{repo}/pulls?state=all"
-        all_prs = await fetch_all_pages(session, prs_url, max_pages=20)
-        
-        prs_merged = 0
-        pr_times = []
-        pr_requested_as_reviewer_count = 0
-        
-        user_prs = [pr for pr in all_prs if pr.get('user', {}).get('login') == login]
-        
-        for pr in user_prs:
-            if pr.get('merged_at'):
-                prs_merged += 1
-                try:
-                    created = datetime.fromisoformat(pr['created_at'].replace('Z', '+00:00'))
-                    merged = datetime.fromisoformat(pr['merged_at'].replace('Z', '+00:00'))
-                    days_to_merge = (merged - created).total_seconds() / (24 * 3600)
-                    pr_times.append(days_to_merge)
-                except:
-                    pass
-
-        for pr in all_prs:
-            if any(r.get('login') == login for r in pr.get('requested_reviewers', [])):
-                pr_requested_as_reviewer_count += 1
+        # strict: se uma página de PRs falhar, o usuário sai com erro (e volta na próxima
+        # execução) em vez de o repositório ficar no cache com uma lista incompleta
+        repo_prs = await pr_cache.get_or_fetch(
+            f"{repo_owner}/{repo}",
+            lambda: iter_all_pages(session, prs_url, max_pages=USER_PR_WINDOW // 100, strict=True)
+        )
+        pr_stats = PRCache.user_stats(repo_prs, login)
+        prs_merged = pr_stats['prs_merged']
+        avg_time_to_merge = pr_stats['avg_time_to_merge']
+        pr_requested_as_reviewer_rate = pr_stats['pr_requested_as_reviewer_rate']
 
         pr_accept_rate = (prs_merged / prs_opened * 100) if prs_opened else 0
-        avg_time_to_merge = sum(pr_times) / len(pr_times) if pr_times else 0
 
         stars_own_repos = 0
         if user_repos and isinstance(user_repos, list):
@@ -137,17 +181,18 @@ async def get_user_detailed_metrics(session, user_data):
         activity_frequency = 0
         
         if commits_total > 0:
-            commits_url = f"{BASE_URL}/repos/{repo_owner}/{repo}/commits?author={login}&per_page=100"
-            commits = await fetch_all_pages(session, commits_url, max_pages=5)
-            
-            if commits:
+            commits_url = f"{BASE_URL}/repos/{repo_owner}/{repo}/commits?author={login}"
+            commits_seen = 0
+            dates = []
+            async for page in iter_all_pages(session, commits_url, max_pages=5):
+                commits_seen += len(page)
+                for c in page:
+                    if 'commit' in c and 'author' in c['commit'] and 'date' in c['commit']['author']:
+                        dates.append(c['commit']['author']['date'])
+
+            if commits_seen:
                 try:
-                    dates = []
-                    for c in commits:
-                        if 'commit' in c and 'author' in c['commit'] and 'date' in c['commit']['author']:
-                            date = datetime.fromisoformat(c['commit']['author']['date'].replace('Z', '+00:00'))
-                            dates.append(date)
-                    
+                    dates = [datetime.fromisoformat(d.replace('Z', '+00:00')) for d in dates]
                     if len(dates) > 1:
                         contribution_period = (max(dates) - min(dates)).days
                         activity_frequency = commits_total / contribution_period if contribution_period else commits_total
@@ -156,7 +201,6 @@ async def get_user_detailed_metrics(session, user_data):
                         activity_frequency = commits_total
                 except Exception as e:
                     pass
-        pr_requested_as_reviewer_rate = (pr_requested_as_reviewer_count / len(all_prs) * 100) if all_prs else 0
 
         result = {
             'repo_name': repo_name,
@@ -194,41 +238,92 @@ async def get_user_detailed_metrics(session, user_data):
             'error': str(e)
         }
 
-async def main():
-    input_csv = 'users_countries.csv'
-    output_csv = 'users_metrics.csv'
-    
+OUTPUT_COLUMNS = [
+    'repo_name', 'repo_url', 'login', 'profile_url', 'location', 'country', 'prs_opened', 'prs_merged',
+    'pr_accept_rate', 'avg_time_to_merge', 'commits_total', 'issues_opened', 'stars_own_repos',
+    'contribution_period', 'activity_frequency', 'pr_requested_as_reviewer_rate'
+]
+
+async def process_users(session, users, on_result):
+    """Fila contínua com USER_WORKERS workers: um usuário entra assim que outro termina,
+    sem esperar o mais lento de um lote; on_result recebe cada resultado ao ficar pronto."""
+    queue = asyncio.Queue()
+    for user in users:
+        queue.put_nowait(user)
+    progress = tqdm_asyncio(total=len(users), desc="Usuários")
+
+    async def worker():
+        while True:
+            try:
+                user = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            result = await get_user_detailed_metrics(session, user)
+            if result:
+                on_result(result)
+            progress.update(1)
+
+    await asyncio.gather(*(worker() for _ in range(min(USER_WORKERS, len(users)))))
+    progress.close()
+
+def user_key(user):
+    return f"{user['repo_url']} {user['login']}"
+
+async def main(input_csv='users_countries.csv', output_csv='users_metrics.csv', shard=None):
+    global limiter
     try:
-        df = pd.read_csv(input_csv)
+        df = load_frame(input_csv)
+        # shard por repositório: os usuários de um repo ficam juntos e dividem o cache de PRs
+        df = df[[in_shard(url, shard) for url in df['repo_url']]]
         users = df.to_dict(orient='records')
     except Exception as e:
         return
+
+    sink = IncrementalCSV(PARTIAL_CSV, OUTPUT_COLUMNS)
+    if sink.done:
+        users = [user for user in users if user_key(user) not in sink.done]
+        print(f"{len(sink.done)} usuários já gravados em {PARTIAL_CSV}; faltam {len(users)}")
+
+    repo_urls = dict(zip(df['repo_name'], df['repo_url']))
+    loaded = pr_cache.load_prs_raw(PRS_RAW_CSV, repo_urls)
+    if loaded:
+        print(f"PRs de {loaded} repositórios carregados de {PRS_RAW_CSV}")
+    full_names = [repo_full_name(url) for url in set(repo_urls.values())]
+    loaded = pr_cache.load_event_store(EventStore(), full_names)
+    if loaded:
+        print(f"PRs de {loaded} repositórios carregados do EventStore")
+    if USE_GRAPHQL:
+        resolved = await prefetch_contributions(users)
+        print(f"Contribuições de {resolved} usuários obtidas via GraphQL")
     
-    results = []
+    failed = []
     connector = aiohttp.TCPConnector(limit=MAX_CONCURRENT, limit_per_host=10)
     timeout = aiohttp.ClientTimeout(total=120)
     
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
-        batch_size = 50
-        for i in range(0, len(users), batch_size):
-            batch = users[i:i+batch_size]
-            tasks = [get_user_detailed_metrics(session, user) for user in batch]
-            
-            batch_results = []
-            for f in tqdm_asyncio.as_completed(tasks, total=len(tasks), desc=f"Lote {i//batch_size + 1}"):
-                result = await f
-                if result:
-                    batch_results.append(result)
-            
-            results.extend(batch_results)
-            if results:
-                pd.DataFrame(results).to_csv('users_metrics_partial.csv', index=False)
-            if i + batch_size < len(users):
-                await asyncio.sleep(2)
-    
-    if results:
-        final_df = pd.DataFrame(results)
+    limiter = AdaptiveConcurrency(MAX_CONCURRENT)
+
+    def on_result(result):
+        # usuário com erro não é marcado como feito: entra de novo na próxima execução
+        if 'error' in result:
+            failed.append(result)
+        else:
+            sink.commit(user_key(result), [result])
+
+    with sink:
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await process_users(session, users, on_result)
+
+    final_df = pd.read_csv(PARTIAL_CSV)
+    if failed:
+        final_df = pd.concat([final_df, pd.DataFrame(failed)], ignore_index=True)
+    if len(final_df):
         final_df.to_csv(output_csv, index=False)
+    if not failed:
+        # todos gravados: a próxima execução recalcula as métricas em vez de repetir estas linhas
+        sink.discard()
+    print(response_cache.summary())
+    print(scheduler.summary())
+    print(limiter.summary())
 
 if __name__ == "__main__":
     asyncio.run(main())
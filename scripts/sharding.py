@@ -0,0 +1,19 @@
+import zlib
+
+
+def parse_shard(value):
+    """'i/N' (i de 0 a N-1) -> (i, N); None ou '' -> None (sem sharding)."""
+    if not value:
+        return None
+    index, count = (int(part) for part in value.split('/'))
+    if count < 1 or not 0 <= index < count:
+        raise ValueError(f'shard inválido: {value!r} (esperado i/N com 0 <= i < N)')
+    return index, count
+
+
+def in_shard(key, shard):
+    """Distribuição estável entre processos/máquinas (crc32, não o hash() aleatorizado do Python)."""
+    if shard is None:
+        return True
+    index, count = shard
+    return zlib.crc32(str(key).encode('utf-8')) % count == index
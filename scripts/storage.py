@@ -0,0 +1,227 @@
+import csv
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+# Parquet tipado para as saídas do pipeline. O CSV continua sendo o formato de troca
+# com o BI (export_csv); o Parquet é o que as etapas e o dashboard carregam rápido.
+# Uso: python storage.py convert users_metrics.csv [users_metrics.parquet]
+#      python storage.py export users_metrics.parquet users_metrics.csv
+#      python storage.py bench ../csvs
+
+
+def _schemas():
+    category = pa.dictionary(pa.int32(), pa.string())
+    timestamp = pa.timestamp('s', tz='UTC')
+    text = pa.string()
+    integer = pa.int64()
+    real = pa.float64()
+    return {
+        'reposFinal': [
+            ('repo_name', category), ('repo_id', integer), ('repo_url', text), ('login', text),
+            ('profile_url', text), ('location', text), ('country', category),
+        ],
+        'users_countries': [
+            ('repo_name', category), ('repo_url', category), ('login', text), ('profile_url', text),
+            ('location', text), ('country', category),
+        ],
+        'repos_metrics': [
+            ('repo_name', text), ('repo_owner', text), ('full_name', text), ('repo_url', text),
+            ('description', text), ('created_at', timestamp), ('updated_at', timestamp),
+            ('language_primary', category), ('topics', pa.list_(text)),
+            ('stars_count', integer), ('forks_count', integer), ('prs_opened_count', integer),
+            ('prs_merged_count', integer), ('commits_count', integer), ('contributors_count', integer),
+            ('active_days', integer), ('time_to_first_response', real), ('time_to_merge', real),
+            ('release_count', integer), ('maintainers_count', integer),
+        ],
+        'users_metrics': [
+            ('repo_name', category), ('repo_url', category), ('login', text), ('profile_url', text),
+            ('location', text), ('country', category), ('prs_opened', integer), ('prs_merged', integer),
+            ('pr_accept_rate', real), ('avg_time_to_merge', real), ('commits_total', integer),
+            ('issues_opened', integer), ('stars_own_repos', integer), ('contribution_period', integer),
+            ('activity_frequency', real), ('pr_requested_as_reviewer_rate', real),
+        ],
+        'prs_raw': [
+            ('repo_name', category), ('pr_number', integer), ('author', text), ('reviewers_requested', text),
+            ('opened_at', timestamp), ('merged_at', timestamp), ('closed_at', timestamp),
+        ],
+        'user_centrality': [('repo_name', category), ('login', text)] + [
+            (f'{graph}_{measure}', integer if measure == 'degree' else real)
+            for graph in ('repo_review', 'review', 'cocontrib')
+            for measure in ('degree', 'pagerank', 'betweenness', 'eigenvector')
+        ],
+    }
+
+
+# como cada conjunto grava datas e listas no CSV (para o export voltar ao mesmo formato)
+TIMESTAMP_FORMATS = {'prs_raw': '%Y-%m-%d %H:%M:%S', 'repos_metrics': '%Y-%m-%dT%H:%M:%SZ'}
+DATASETS = ['users_countries', 'users_metrics', 'user_centrality', 'repos_metrics', 'reposFinal', 'prs_raw']
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError('Parquet requer o pyarrow: pip install pyarrow')
+
+
+def dataset_for(path):
+    """Nome do conjunto pelo arquivo ('csvs/users_metrics 19.00.05.csv' -> 'users_metrics'), ou None."""
+    name = os.path.basename(path)
+    for dataset in DATASETS:
+        if name.startswith(dataset):
+            return dataset
+    return None
+
+
+def schema_for(dataset):
+    require_pyarrow()
+    return pa.schema(_schemas()[dataset])
+
+
+def csv_names(path, dataset=None):
+    """Nomes das colunas do schema quando o cabeçalho tem menos colunas que as linhas (como
+    no repos_metrics do snapshot); None quando o cabeçalho do arquivo basta."""
+    dataset = dataset or dataset_for(path)
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        first = next(reader, header)
+    if dataset and pa is not None and len(first) > len(header):
+        columns = schema_for(dataset).names
+        if columns[:len(header)] == header and len(first) <= len(columns):
+            return columns[:len(first)]
+    return None
+
+
+def load_csv(path, dataset=None):
+    """Lê um CSV do pipeline como texto, com os nomes de csv_names se o cabeçalho for curto."""
+    names = csv_names(path, dataset)
+    if names:
+        return pd.read_csv(path, header=0, names=names, dtype=str, keep_default_na=False)
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+
+def _column(values, field_type):
+    if pa.types.is_timestamp(field_type):
+        parsed = pd.to_datetime(values.replace('', None), utc=True, errors='coerce', format='mixed')
+        return pa.array(parsed, type=field_type, from_pandas=True)
+    if pa.types.is_list(field_type):
+        lists = [
+            v if isinstance(v, list) else [t for t in str(v).split(',') if t] if isinstance(v, str) else []
+            for v in values
+        ]
+        return pa.array(lists, type=field_type)
+    if pa.types.is_integer(field_type):
+        return pa.array(pd.to_numeric(values, errors='coerce').astype('Int64'), type=field_type, from_pandas=True)
+    if pa.types.is_floating(field_type):
+        return pa.array(pd.to_numeric(values, errors='coerce'), type=field_type, from_pandas=True)
+    strings = pa.array(values.astype(object).where(values.notna() & (values != ''), None), type=pa.string())
+    if pa.types.is_dictionary(field_type):
+        return strings.dictionary_encode()
+    return strings
+
+
+def to_table(df, dataset):
+    """DataFrame -> tabela Arrow com o schema do conjunto; colunas extras vão com tipo inferido."""
+    schema = schema_for(dataset)
+    arrays, fields = [], []
+    for field in schema:
+        if field.name not in df.columns:
+            continue
+        arrays.append(_column(df[field.name], field.type))
+        fields.append(field)
+    for name in df.columns:
+        if name not in schema.names:
+            arrays.append(pa.array(df[name], from_pandas=True))
+            fields.append(pa.field(name, arrays[-1].type))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+
+def write_parquet(df, path, dataset):
+    require_pyarrow()
+    pq.write_table(to_table(df, dataset), path, compression='zstd')
+
+
+def convert(csv_path, parquet_path=None, dataset=None):
+    """Gera o .parquet de um CSV do pipeline; devolve o caminho gravado."""
+    dataset = dataset or dataset_for(csv_path)
+    if dataset is None:
+        raise ValueError(f'conjunto desconhecido para {csv_path!r}; informe o dataset')
+    parquet_path = parquet_path or os.path.splitext(csv_path)[0] + '.parquet'
+    write_parquet(load_csv(csv_path, dataset), parquet_path, dataset)
+    return parquet_path
+
+
+def read_frame(path, columns=None):
+    """DataFrame de um .parquet (memory-mapped; categorias viram Categorical e inteiros com
+    vazios ficam Int64) ou de um CSV."""
+    if path.endswith('.parquet'):
+        require_pyarrow()
+        table = pq.read_table(path, columns=columns, memory_map=True)
+        return table.to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    return pd.read_csv(path, usecols=columns)
+
+
+def export_csv(parquet_path, csv_path, dataset=None):
+    """Parquet -> CSV no formato que o BI já consome (datas como no coletor, listas com vírgula)."""
+    dataset = dataset or dataset_for(parquet_path)
+    df = read_frame(parquet_path)
+    date_format = TIMESTAMP_FORMATS.get(dataset, '%Y-%m-%d %H:%M:%S')
+    for name in df.columns:
+        column = df[name]
+        if pd.api.types.is_datetime64_any_dtype(column):
+            df[name] = column.dt.strftime(date_format).fillna('')
+        elif column.dtype == object and column.map(lambda v: hasattr(v, '__len__') and not isinstance(v, str)).any():
+            df[name] = column.map(lambda v: ','.join(v) if v is not None and not isinstance(v, str) else (v or ''))
+    df.to_csv(csv_path, index=False)
+    return csv_path
+
+
+def _best_of(func, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def bench(directory, out_dir=None):
+    """Tamanho e tempo de carga CSV x Parquet para cada CSV conhecido do diretório. Os .parquet
+    vão para out_dir ou, sem ele, para um diretório temporário (nunca ao lado dos CSVs)."""
+    if out_dir is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            return bench(directory, tmp)
+    print(f"{'arquivo':<32}{'CSV KB':>10}{'Parquet KB':>12}{'CSV ms':>10}{'Parquet ms':>12}")
+    for name in sorted(os.listdir(directory)):
+        dataset = dataset_for(name)
+        if not name.endswith('.csv') or dataset is None:
+            continue
+        csv_path = os.path.join(directory, name)
+        parquet_path = convert(csv_path, os.path.join(out_dir, f'{dataset}.parquet'), dataset)
+        csv_time = _best_of(lambda: pd.read_csv(csv_path))
+        parquet_time = _best_of(lambda: read_frame(parquet_path))
+        print(f"{dataset:<32}{os.path.getsize(csv_path) / 1024:>10.0f}{os.path.getsize(parquet_path) / 1024:>12.0f}"
+              f"{csv_time * 1000:>10.1f}{parquet_time * 1000:>12.1f}")
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+    if command == 'convert' and len(sys.argv) > 2:
+        print(convert(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None))
+    elif command == 'export' and len(sys.argv) > 3:
+        print(export_csv(sys.argv[2], sys.argv[3]))
+    elif command == 'bench':
+        bench(sys.argv[2] if len(sys.argv) > 2 else '.', sys.argv[3] if len(sys.argv) > 3 else None)
+    else:
+        print('uso: python storage.py convert <csv> [parquet] | export <parquet> <csv> | bench [dir] [saida]')
+        sys.exit(1)
@@ -0,0 +1,33 @@
+import os
+
+import pandas as pd
+
+import loaders
+from loaders import load_frame
+
+SNAPSHOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'csvs', 'repos_metrics 19.00.05.csv')
+
+
+def test_repos_metrics_snapshot_header_shorter_than_rows():
+    # o cabeçalho do snapshot para em forks_count, mas as linhas têm as 20 colunas do schema
+    df = load_frame(SNAPSHOT)
+    assert len(df) == 200
+    assert list(df.columns[:11]) == [
+        'repo_name', 'repo_owner', 'full_name', 'repo_url', 'description', 'created_at', 'updated_at',
+        'language_primary', 'topics', 'stars_count', 'forks_count',
+    ]
+    assert isinstance(df.index, pd.RangeIndex)
+    assert (df['full_name'].astype(str) == df['repo_owner'].astype(str) + '/' + df['repo_name'].astype(str)).all()
+    assert df['repo_url'].astype(str).str.startswith('https://github.com/').all()
+    assert pd.api.types.is_integer_dtype(df['stars_count'])
+    assert pd.api.types.is_datetime64_any_dtype(df['created_at'])
+
+
+def test_category_column_empty_or_numeric_in_one_chunk(tmp_path, monkeypatch):
+    path = tmp_path / 'users_countries.csv'
+    path.write_text('login,location\na,\nb,\nc,123\nd,Recife\n', encoding='utf-8')
+    monkeypatch.setattr(loaders, 'CHUNK_ROWS', 2)
+    df = load_frame(str(path))
+    assert isinstance(df['location'].dtype, pd.CategoricalDtype)
+    assert df['location'].tolist()[2:] == ['123', 'Recife']
+    assert df['location'].isna().sum() == 2
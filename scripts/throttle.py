@@ -0,0 +1,153 @@
+import asyncio
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+
+def default_limits(num_tokens=1):
+    """(requisições/s, rajada) por upstream; 'host/segmento' tem prioridade sobre 'host'."""
+    n = max(num_tokens, 1)
+    return {
+        'api.github.com': (n * 5000 / 3600, 100),
+        'api.github.com/search': (n * 30 / 60, 10),
+        'api.github.com/graphql': (n * 5000 / 3600, 20),
+        # política de uso do Nominatim: no máximo 1 requisição por segundo
+        'nominatim.openstreetmap.org': (1.0, 1),
+    }
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self):
+        """Consome uma ficha e devolve quantos segundos o chamador deve esperar por ela."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+
+class Throttle:
+    """Token buckets por upstream, compartilhados por todas as threads de um script."""
+
+    def __init__(self, limits):
+        self._buckets = {key: TokenBucket(rate, burst) for key, (rate, burst) in limits.items()}
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.waited = {}
+        self.calls = {}
+
+    def configure(self, key, rate, burst):
+        self._buckets[key] = TokenBucket(rate, burst)
+
+    def bucket_for(self, url):
+        parsed = urlparse(url)
+        segment = parsed.path.strip('/').split('/')[0]
+        return (self._buckets.get(f'{parsed.netloc}/{segment}')
+                or self._buckets.get(parsed.netloc)
+                or self._buckets.get('*'))
+
+    @contextmanager
+    def stage(self, name):
+        previous = getattr(self._local, 'stage', None)
+        self._local.stage = name
+        try:
+            yield
+        finally:
+            self._local.stage = previous
+
+    def _record(self, stage, delay):
+        stage = stage or getattr(self._local, 'stage', None) or 'default'
+        with self._lock:
+            self.calls[stage] = self.calls.get(stage, 0) + 1
+            self.waited[stage] = self.waited.get(stage, 0.0) + delay
+
+    def wait(self, url, stage=None):
+        bucket = self.bucket_for(url)
+        delay = bucket.reserve() if bucket else 0
+        if delay:
+            time.sleep(delay)
+        self._record(stage, delay)
+        return delay
+
+    async def wait_async(self, url, stage=None):
+        bucket = self.bucket_for(url)
+        delay = bucket.reserve() if bucket else 0
+        if delay:
+            await asyncio.sleep(delay)
+        self._record(stage, delay)
+        return delay
+
+    def summary(self):
+        with self._lock:
+            parts = [f'{stage}: {self.waited[stage]:.1f}s em {self.calls[stage]} chamadas' for stage in sorted(self.calls)]
+        return 'Espera no throttle por etapa: ' + ('; '.join(parts) if parts else 'nenhuma')
+
+
+class AdaptiveConcurrency:
+    """Semáforo assíncrono cujo limite reage ao upstream.
+
+    Um 403/limite secundário corta o limite pela metade (mínimo 1; os 403 que chegam
+    em seguida, dentro de `cooldown` segundos, vêm das mesmas requisições e não cortam
+    de novo) e cada `recover_after` respostas boas seguidas devolvem uma vaga, até `maximum`.
+    Deve ser criado dentro do event loop que vai usá-lo.
+    """
+
+    def __init__(self, maximum, recover_after=20, cooldown=1.0):
+        self.maximum = max(maximum, 1)
+        self.limit = self.maximum
+        self.recover_after = recover_after
+        self.cooldown = cooldown
+        self._last_backoff = float('-inf')
+        self.in_flight = 0
+        self.backoffs = 0
+        self.lowest = self.maximum
+        self._streak = 0
+        self._condition = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < self.limit)
+            self.in_flight += 1
+        return self
+
+    async def __aexit__(self, *exc):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    def backoff(self):
+        self._streak = 0
+        now = time.monotonic()
+        if now - self._last_backoff < self.cooldown:
+            return
+        self._last_backoff = now
+        self.limit = max(self.limit // 2, 1)
+        self.lowest = min(self.lowest, self.limit)
+        self.backoffs += 1
+
+    def succeed(self):
+        self._streak += 1
+        if self._streak >= self.recover_after and self.limit < self.maximum:
+            self.limit += 1
+            self._streak = 0
+            # a vaga nova vale para quem já está esperando
+            asyncio.get_running_loop().create_task(self._wake())
+
+    async def _wake(self):
+        async with self._condition:
+            self._condition.notify_all()
+
+    def summary(self):
+        return (f'Concorrência: limite atual {self.limit}/{self.maximum}, mínimo {self.lowest}, '
+                f'{self.backoffs} reduções por 403')
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import re
+import threading
+import time
+
+DEFAULT_LIMITS = {'core': 5000, 'search': 30, 'graphql': 5000}
+FALLBACK_PARK = 60
+
+
+def load_tokens(path=None):
+    """Tokens de GITHUB_TOKENS (separados por vírgula/espaço) ou de um arquivo, um por linha.
+
+    O arquivo vem de `path` ou de GITHUB_TOKENS_FILE; linhas vazias e com # são ignoradas.
+    """
+    tokens = re.split(r'[\s,]+', os.environ.get('GITHUB_TOKENS', '').strip())
+    path = path or os.environ.get('GITHUB_TOKENS_FILE')
+    if path:
+        with open(path, encoding='utf-8') as f:
+            tokens += [line.strip() for line in f if not line.strip().startswith('#')]
+    return list(dict.fromkeys(t for t in tokens if t))
+
+
+def resource_for(url):
+    if '/search/' in url:
+        return 'search'
+    if url.rstrip('/').endswith('/graphql'):
+        return 'graphql'
+    return 'core'
+
+
+def is_rate_limited(response):
+    if response.status_code not in (403, 429):
+        return False
+    headers = response.headers
+    return (
+        headers.get('X-RateLimit-Remaining') == '0'
+        or 'Retry-After' in headers
+        or 'rate limit' in response.text.lower()
+    )
+
+
+class TokenScheduler:
+    """Distribui tokens pelo saldo de rate limit informado pela API, por recurso (core/search/graphql).
+
+    Um token esgotado fica estacionado até o X-RateLimit-Reset dele; só quando todos
+    estão esgotados é que quem pede um token espera, e apenas até o reset mais próximo.
+    """
+
+    def __init__(self, tokens):
+        self._lock = threading.Lock()
+        # sem tokens as chamadas saem sem autenticação, contabilizadas sob None
+        self._tokens = list(tokens) or [None]
+        self._remaining = {t: {} for t in self._tokens}
+        self._reset = {t: {} for t in self._tokens}
+        self._counters = {t: {'requests': 0, 'rate_limited': 0} for t in self._tokens}
+        self.waited = 0.0
+
+    def _try_acquire(self, resource):
+        now = time.time()
+        with self._lock:
+            best = None
+            best_remaining = -1
+            next_reset = None
+            for token in self._tokens:
+                remaining = self._remaining[token].get(resource)
+                reset = self._reset[token].get(resource, 0)
+                if remaining is not None and remaining <= 0:
+                    if now < reset:
+                        next_reset = reset if next_reset is None else min(next_reset, reset)
+                        continue
+                    remaining = None
+                    self._remaining[token].pop(resource, None)
+                if remaining is None:
+                    remaining = DEFAULT_LIMITS.get(resource, DEFAULT_LIMITS['core'])
+                if remaining > best_remaining:
+                    best, best_remaining = token, remaining
+            if best_remaining >= 0:
+                if resource in self._remaining[best]:
+                    self._remaining[best][resource] -= 1
+                self._counters[best]['requests'] += 1
+                return best, 0
+            return None, max(next_reset - now, 0.1)
+
+    def acquire(self, resource='core'):
+        while True:
+            token, wait = self._try_acquire(resource)
+            if not wait:
+                return token
+            self._add_wait(wait)
+            time.sleep(wait)
+
+    async def acquire_async(self, resource='core'):
+        while True:
+            token, wait = self._try_acquire(resource)
+            if not wait:
+                return token
+            self._add_wait(wait)
+            await asyncio.sleep(wait)
+
+    def _add_wait(self, wait):
+        with self._lock:
+            self.waited += wait
+
+    def update(self, token, response, resource='core'):
+        if getattr(response, 'from_cache', False):
+            return
+        headers = response.headers
+        resource = headers.get('X-RateLimit-Resource', resource)
+        with self._lock:
+            if token not in self._remaining:
+                return
+            remaining = headers.get('X-RateLimit-Remaining')
+            reset = headers.get('X-RateLimit-Reset')
+            if remaining is not None:
+                self._remaining[token][resource] = int(remaining)
+            if reset is not None:
+                self._reset[token][resource] = int(reset)
+            if is_rate_limited(response):
+                self._counters[token]['rate_limited'] += 1
+                self._remaining[token][resource] = 0
+                retry_after = headers.get('Retry-After')
+                if retry_after is not None:
+                    self._reset[token][resource] = time.time() + int(retry_after)
+                elif remaining != '0' or reset is None:
+                    # limite secundário: o reset do cabeçalho é o do limite primário
+                    self._reset[token][resource] = time.time() + FALLBACK_PARK
+
+    def counters(self):
+        with self._lock:
+            result = {}
+            for token in self._tokens:
+                label = f'...{token[-4:]}' if token else 'anon'
+                result[label] = {
+                    **self._counters[token],
+                    **{f'{r}_remaining': v for r, v in self._remaining[token].items()},
+                }
+            return result
+
+    def summary(self):
+        lines = [f'Tokens (espera total por reset: {round(self.waited, 1)}s):']
+        for label, counters in self.counters().items():
+            details = ', '.join(f'{k}={v}' for k, v in counters.items())
+            lines.append(f'  {label}: {details}')
+        return '\n'.join(lines)